@@ -0,0 +1,24 @@
+from django.apps import AppConfig
+from django.conf import settings
+from django.core import checks
+from django.core.exceptions import ImproperlyConfigured
+
+
+class BackendConfig(AppConfig):
+    name = "backend"
+
+    def ready(self):
+        from .checks import check_production_settings
+
+        checks.register(check_production_settings)
+        # Servers don't run system checks, so a production process refuses to
+        # start on a broken configuration here instead of failing on requests.
+        if settings.SETTINGS_PROFILE == "production":
+            errors = [
+                error for error in check_production_settings() if error.is_serious()
+            ]
+            if errors:
+                raise ImproperlyConfigured(
+                    "Production settings check failed:\n"
+                    + "\n".join(str(error) for error in errors)
+                )
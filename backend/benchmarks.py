@@ -0,0 +1,29 @@
+import resource
+from contextlib import contextmanager
+
+from django.db import transaction
+
+
+@contextmanager
+def rolled_back():
+    """
+    Run the block in a transaction that is always rolled back, so benchmark
+    commands can create whatever data they measure against and leave the
+    database as they found it.
+    """
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def rss_bytes():
+    """Current resident memory of this process."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # peak rather than current size, but available everywhere
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
@@ -0,0 +1,94 @@
+import os
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+DEVELOPMENT_MIDDLEWARE = {
+    "django.contrib.sessions.middleware.SessionMiddleware",
+    "django.middleware.csrf.CsrfViewMiddleware",
+    "django.contrib.messages.middleware.MessageMiddleware",
+}
+
+
+def check_production_settings(app_configs=None, **kwargs):
+    """Configuration mistakes that matter when SETTINGS_PROFILE is production."""
+    if settings.SETTINGS_PROFILE != "production":
+        return []
+
+    errors = []
+    if settings.DEBUG:
+        errors.append(
+            checks.Error("DEBUG must be off in production.", id="backend.E001")
+        )
+    if not settings.ALLOWED_HOSTS:
+        errors.append(
+            checks.Error(
+                "ALLOWED_HOSTS is empty, every request would be rejected.",
+                hint="Set DJANGO_ALLOWED_HOSTS to a comma separated list of hosts.",
+                id="backend.E003",
+            )
+        )
+
+    receipts_root = settings.RECEIPTS_ROOT
+    while not os.path.exists(receipts_root):
+        receipts_root = os.path.dirname(receipts_root)
+    if not os.access(receipts_root, os.W_OK):
+        errors.append(
+            checks.Error(
+                f"RECEIPTS_ROOT ({settings.RECEIPTS_ROOT}) is not writable.",
+                id="backend.E004",
+            )
+        )
+
+    try:
+        cache = caches["default"]
+        cache.set("backend:check", 1, 5)
+        reachable = cache.get("backend:check") == 1
+    except Exception:
+        reachable = False
+    if not reachable:
+        errors.append(
+            checks.Error("The default cache can't be reached.", id="backend.E005")
+        )
+
+    shared_alias = getattr(settings, "EXPENSE_LIST_CACHE", {}).get(
+        "SHARED_ALIAS", "default"
+    )
+    if isinstance(caches[shared_alias], (LocMemCache, DummyCache)):
+        errors.append(
+            checks.Warning(
+                f"The expense list cache is off: its shared tier, the "
+                f"{shared_alias!r} cache, is local to each process.",
+                hint="Point EXPENSE_LIST_CACHE['SHARED_ALIAS'] at a Redis or "
+                "Memcached cache.",
+                id="backend.W003",
+            )
+        )
+
+    if DEVELOPMENT_MIDDLEWARE.intersection(settings.MIDDLEWARE):
+        errors.append(
+            checks.Warning(
+                "Session, CSRF or messages middleware is installed but the API "
+                "authenticates with JWT only.",
+                id="backend.W001",
+            )
+        )
+    for template in settings.TEMPLATES:
+        # Without explicit loaders Django wraps the default ones in the cached
+        # loader itself.
+        loaders = template.get("OPTIONS", {}).get("loaders")
+        if loaders is not None and not any(
+            isinstance(loader, (list, tuple))
+            and loader[0] == "django.template.loaders.cached.Loader"
+            for loader in loaders
+        ):
+            errors.append(
+                checks.Warning(
+                    "Templates are not loaded through the cached loader.",
+                    id="backend.W002",
+                )
+            )
+    return errors
@@ -0,0 +1,120 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections
+from django.test import Client
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from backend.benchmarks import rolled_back, rss_bytes
+from expense.models import Expense, ExpenseSplit
+from user.models import User
+
+PROFILES = ("development", "production")
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-request time and memory of the development and production "
+        "settings profiles, each measured in its own process"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--expenses", type=int, default=20)
+        parser.add_argument(
+            "--worker", action="store_true", help="Measure the current profile only"
+        )
+
+    def handle(self, *args, **options):
+        if options["worker"]:
+            with rolled_back():
+                self.stdout.write(json.dumps(self.measure(options)))
+            return
+
+        results = {}
+        for profile in PROFILES:
+            env = dict(os.environ, DJANGO_SETTINGS_PROFILE=profile)
+            env.setdefault("DJANGO_ALLOWED_HOSTS", "testserver")
+            proc = subprocess.run(
+                [
+                    sys.executable,
+                    str(settings.BASE_DIR / "manage.py"),
+                    "bench_settings",
+                    "--worker",
+                    "--requests",
+                    str(options["requests"]),
+                    "--expenses",
+                    str(options["expenses"]),
+                ],
+                env=env,
+                capture_output=True,
+                text=True,
+            )
+            if proc.returncode:
+                raise CommandError(f"{profile} run failed:\n{proc.stderr}")
+            results[profile] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+        self.stdout.write(
+            f"{'profile':>12} {'detail':>9} {'list':>9} "
+            f"{'RSS start':>10} {'RSS end':>10}"
+        )
+        for profile, result in results.items():
+            self.stdout.write(
+                f"{profile:>12} "
+                f"{result['detail_us']:>7.0f}us "
+                f"{result['list_us']:>7.0f}us "
+                f"{result['rss_start'] / 2**20:>8.1f}MB "
+                f"{result['rss_end'] / 2**20:>8.1f}MB"
+            )
+
+    def measure(self, options):
+        # The outer transaction must survive each request, so don't let the
+        # request signals close the connection, as Django's TestCase does.
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+
+        user = User.objects.create_user(
+            "bench_settings", "bench_settings@example.com", "0000000000", "x"
+        )
+        expenses = Expense.objects.bulk_create(
+            Expense(owner=user, title=f"Expense {i}", amount=100, split_type="EXACT")
+            for i in range(options["expenses"])
+        )
+        ExpenseSplit.objects.bulk_create(
+            ExpenseSplit(expense=expense, user=user, value=100) for expense in expenses
+        )
+        client = Client(
+            HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(user).access_token}"
+        )
+        # as the test runner does, so development settings accept the client
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "testserver"]
+        # each request of the loop is a throttled user, lift the limit
+        settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"]["user"] = None
+
+        detail = f"/api/v1/expenses/{expenses[0].id}/"
+        listing = "/api/v1/expenses/"
+        for path in (detail, listing):
+            response = client.get(path)
+            if response.status_code != 200:
+                raise CommandError(f"GET {path} returned {response.status_code}")
+
+        rss_start = rss_bytes()
+        timings = {}
+        for name, path in (("detail", detail), ("list", listing)):
+            start = time.perf_counter()
+            for _ in range(options["requests"]):
+                client.get(path)
+            timings[name] = (time.perf_counter() - start) / options["requests"]
+
+        return {
+            "detail_us": timings["detail"] * 1e6,
+            "list_us": timings["list"] * 1e6,
+            "rss_start": rss_start,
+            "rss_end": rss_bytes(),
+        }
@@ -0,0 +1,52 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory
+
+from backend.throttling import (
+    CacheBucketStore,
+    IPTokenBucketThrottle,
+    LocalBucketStore,
+)
+
+
+class BenchThrottle(IPTokenBucketThrottle):
+    scope = "bench"
+
+
+class Command(BaseCommand):
+    help = "Measure the overhead of a token bucket throttle check"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--checks", type=int, default=100000)
+        parser.add_argument(
+            "--clients", type=int, default=1000, help="distinct buckets to spread over"
+        )
+
+    def handle(self, *args, **options):
+        checks, clients = options["checks"], options["clients"]
+        keys = [f"bench:{i}" for i in range(clients)]
+
+        for name, store in (
+            ("LocalBucketStore", LocalBucketStore()),
+            ("CacheBucketStore", CacheBucketStore()),
+        ):
+            start = time.perf_counter()
+            for i in range(checks):
+                store.consume(keys[i % clients], 1000, 1000.0)
+            self.report(name, time.perf_counter() - start, checks)
+
+        # full DRF throttle check, with a rate high enough never to reject
+        rest_framework = dict(settings.REST_FRAMEWORK)
+        rest_framework["DEFAULT_THROTTLE_RATES"] = {"bench": f"{checks}/s"}
+        request = APIRequestFactory().get("/", REMOTE_ADDR="10.0.0.1")
+        with override_settings(REST_FRAMEWORK=rest_framework):
+            start = time.perf_counter()
+            for _ in range(checks):
+                BenchThrottle().allow_request(request, None)
+            self.report("allow_request", time.perf_counter() - start, checks)
+
+    def report(self, name, elapsed, checks):
+        self.stdout.write(f"{name:>18}: {elapsed / checks * 1e6:.2f} us/check")
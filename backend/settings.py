@@ -3,6 +3,7 @@ import os
 from dotenv import load_dotenv
 from pathlib import Path
 from datetime import timedelta
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -32,6 +33,8 @@ INSTALLED_APPS = [
     "user",
     "rest_framework",
     "rest_framework_simplejwt",
+    "django_filters",
+    "backend",
     "expense",
 ]
 
@@ -42,6 +45,17 @@ REST_FRAMEWORK = {
         "rest_framework_simplejwt.authentication.JWTAuthentication",
     ),
     "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
+    "DEFAULT_RENDERER_CLASSES": [
+        "expense.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_THROTTLE_CLASSES": ["backend.throttling.UserTokenBucketThrottle"],
+    # token buckets: "<burst size>/<period>", refilled at that same rate
+    "DEFAULT_THROTTLE_RATES": {
+        "user": "600/min",
+        "pdf": "10/min",
+        "login": "20/min",
+    },
 }
 
 from datetime import timedelta
@@ -51,6 +65,61 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
 }
 
+# Pub/sub used to push expense changes to participants over server-sent events
+EXPENSE_EVENTS_BROKER = "expense.events.LocalBroker"
+# seconds between keep-alive comments on an idle event stream
+EXPENSE_EVENTS_KEEPALIVE = 15
+
+# The shared tier of the expense list cache lives in the "default" cache. The
+# list cache is off while that is a per-process cache like this one: point it at
+# a backend every worker and management command sees (Redis, Memcached) to turn
+# it on.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+EXPENSE_LIST_CACHE = {
+    "LOCAL_MAX_BYTES": 16 * 1024 * 1024,
+    "SHARED_ALIAS": "default",
+    "TIMEOUT": 300,
+}
+
+# FX rates are stored as the value of one unit of a currency in this currency
+FX_BASE_CURRENCY = "INR"
+# seconds a worker keeps its in-memory copy of the FX rates table
+FX_RATES_TTL = 300
+
+# how long the response to a request with an Idempotency-Key is replayed
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+# an unfinished request holding a key longer than this is assumed to have died
+IDEMPOTENCY_KEY_LOCK_TIMEOUT = timedelta(minutes=1)
+
+# Where throttle buckets live: LocalBucketStore limits each worker separately,
+# CacheBucketStore shares them between workers through TOKEN_BUCKET_CACHE.
+TOKEN_BUCKET_STORE = "backend.throttling.LocalBucketStore"
+TOKEN_BUCKET_CACHE = "default"
+
+# seconds user search results and username lookups are cached for
+USER_DIRECTORY_CACHE_TIMEOUT = 30
+
+# How expense audit entries reach the database once their transaction commits:
+# BackgroundWriter batches them from a thread, SyncWriter inserts right away.
+AUDIT_LOG_WRITER = "expense.audit.BackgroundWriter"
+
+# Receipt images, stored under the hash of their content
+RECEIPTS_ROOT = BASE_DIR / "receipts"
+RECEIPT_MAX_BYTES = 10 * 1024 * 1024
+# longest side in pixels of each reduced copy, made by RECEIPT_WORKERS threads
+RECEIPT_VARIANTS = {"thumb": 256, "medium": 1600}
+RECEIPT_WORKERS = 2
+# Set to "X-Accel-Redirect" (nginx) or "X-Sendfile" (Apache) to let the web
+# server send receipt files. nginx must serve RECEIPTS_ROOT as an internal
+# location at RECEIPTS_SENDFILE_PREFIX.
+RECEIPTS_SENDFILE_HEADER = None
+RECEIPTS_SENDFILE_PREFIX = "/protected-receipts/"
+
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
@@ -97,6 +166,34 @@ DATABASES = {
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
+# Password hashing
+# https://docs.djangoproject.com/en/5.0/topics/auth/passwords/
+
+# Hasher for new and re-hashed passwords: "pbkdf2", "scrypt" or "argon2" (needs
+# the argon2-cffi package). The others stay available to check old hashes;
+# switching re-hashes each password on its owner's next login.
+PASSWORD_HASHER = os.getenv("PASSWORD_HASHER", "pbkdf2")
+
+PASSWORD_HASHER_PARAMS = {
+    "pbkdf2_iterations": int(os.getenv("PASSWORD_PBKDF2_ITERATIONS", 720000)),
+    "scrypt_work_factor": int(os.getenv("PASSWORD_SCRYPT_WORK_FACTOR", 2**14)),
+    "scrypt_block_size": 8,
+    "scrypt_parallelism": 1,
+    "argon2_time_cost": int(os.getenv("PASSWORD_ARGON2_TIME_COST", 2)),
+    "argon2_memory_cost": int(os.getenv("PASSWORD_ARGON2_MEMORY_COST", 102400)),
+    "argon2_parallelism": 8,
+}
+
+_PASSWORD_HASHERS = {
+    "pbkdf2": "user.hashers.TunedPBKDF2PasswordHasher",
+    "scrypt": "user.hashers.TunedScryptPasswordHasher",
+    "argon2": "user.hashers.TunedArgon2PasswordHasher",
+}
+
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[PASSWORD_HASHER]] + [
+    hasher for name, hasher in _PASSWORD_HASHERS.items() if name != PASSWORD_HASHER
+]
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -134,3 +231,70 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# Production profile, picked with DJANGO_SETTINGS_PROFILE=production. Clients
+# authenticate with JWT only, so the stack drops the admin, sessions, messages
+# and CSRF, and the browsable API. DEBUG is off, which also stops Django from
+# recording every SQL query of a request. The startup check in backend.checks
+# refuses to start on missing ALLOWED_HOSTS.
+SETTINGS_PROFILE = os.getenv("DJANGO_SETTINGS_PROFILE", "development")
+
+if SETTINGS_PROFILE == "production":
+    # Checked here: simplejwt already fails on an empty key while the apps
+    # load, before any system check could report it.
+    if not SECRET_KEY:
+        raise ImproperlyConfigured("DJANGO_SECRET_KEY must be set in production.")
+
+    DEBUG = False
+    ALLOWED_HOSTS = [
+        host for host in os.getenv("DJANGO_ALLOWED_HOSTS", "").split(",") if host
+    ]
+
+    INSTALLED_APPS = [
+        app
+        for app in INSTALLED_APPS
+        if app
+        not in (
+            "django.contrib.admin",
+            "django.contrib.sessions",
+            "django.contrib.messages",
+        )
+    ]
+    MIDDLEWARE = [
+        "django.middleware.security.SecurityMiddleware",
+        "django.middleware.common.CommonMiddleware",
+    ]
+    # JSON responses can't be framed and nothing uses cookie authentication
+    SILENCED_SYSTEM_CHECKS = ["security.W002", "security.W003"]
+    REST_FRAMEWORK["DEFAULT_RENDERER_CLASSES"] = [
+        "expense.renderers.FastJSONRenderer",
+    ]
+
+    TEMPLATES[0]["APP_DIRS"] = False
+    TEMPLATES[0]["OPTIONS"] = {
+        "context_processors": ["django.template.context_processors.request"],
+        "loaders": [
+            (
+                "django.template.loaders.cached.Loader",
+                [
+                    "django.template.loaders.filesystem.Loader",
+                    "django.template.loaders.app_directories.Loader",
+                ],
+            ),
+        ],
+    }
+
+    # Per-process cache; point this at Redis or Memcached to share the
+    # expense list cache and throttle buckets between workers.
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "expense-api",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        }
+    }
+
+    # reuse database connections across requests
+    DATABASES["default"]["CONN_MAX_AGE"] = 60
+    DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
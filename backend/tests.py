@@ -0,0 +1,121 @@
+import os
+import subprocess
+import sys
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.test import SimpleTestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from backend.throttling import LocalBucketStore, UserTokenBucketThrottle, get_store
+from user.models import User
+
+
+def throttle_rates(**rates):
+    return {
+        **settings.REST_FRAMEWORK,
+        "DEFAULT_THROTTLE_RATES": {
+            **settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"],
+            **rates,
+        },
+    }
+
+
+class LocalBucketStoreTests(SimpleTestCase):
+    @mock.patch("backend.throttling.time.monotonic")
+    def test_bucket_refills_over_time(self, monotonic):
+        store = LocalBucketStore()
+        monotonic.return_value = 100.0
+        self.assertEqual(store.consume("key", 2, 1.0), 0)
+        self.assertEqual(store.consume("key", 2, 1.0), 0)
+        self.assertEqual(store.consume("key", 2, 1.0), 1.0)
+        # other keys have their own bucket
+        self.assertEqual(store.consume("other", 2, 1.0), 0)
+
+        monotonic.return_value = 100.5
+        self.assertEqual(store.consume("key", 2, 1.0), 0.5)
+        monotonic.return_value = 101.0
+        self.assertEqual(store.consume("key", 2, 1.0), 0)
+        self.assertEqual(store.consume("key", 2, 1.0), 1.0)
+
+        # never more than the capacity, however long it has been
+        monotonic.return_value = 1000.0
+        self.assertEqual(store.consume("key", 2, 1.0), 0)
+        self.assertEqual(store.consume("key", 2, 1.0), 0)
+        self.assertEqual(store.consume("key", 2, 1.0), 1.0)
+
+
+@override_settings(REST_FRAMEWORK=throttle_rates(user="1/min"))
+class UserTokenBucketThrottleTests(SimpleTestCase):
+    def setUp(self):
+        get_store.cache_clear()
+        self.addCleanup(get_store.cache_clear)
+
+    def test_anonymous_requests_are_not_limited(self):
+        request = APIRequestFactory().get("/")
+        request.user = AnonymousUser()
+        throttle = UserTokenBucketThrottle()
+        for _ in range(5):
+            self.assertTrue(throttle.allow_request(request, None))
+
+    def test_users_are_limited(self):
+        request = APIRequestFactory().get("/")
+        request.user = User(pk=1)
+        throttle = UserTokenBucketThrottle()
+        self.assertTrue(throttle.allow_request(request, None))
+        self.assertFalse(throttle.allow_request(request, None))
+        self.assertGreater(throttle.wait(), 0)
+
+
+@override_settings(REST_FRAMEWORK=throttle_rates(pdf="2/min", login="2/min"))
+class ThrottledEndpointTests(APITestCase):
+    def setUp(self):
+        get_store.cache_clear()
+        self.addCleanup(get_store.cache_clear)
+        self.alice = User.objects.create_user(
+            "alice", "alice@example.com", "1234567890", "password-1"
+        )
+
+    def assertThrottledAfter(self, count, request):
+        for _ in range(count):
+            self.assertNotEqual(request().status_code, 429)
+        response = request()
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreater(int(response["Retry-After"]), 0)
+
+    def test_pdf_downloads(self):
+        self.client.force_authenticate(self.alice)
+        self.assertThrottledAfter(
+            2, lambda: self.client.get("/api/v1/my-expense/download")
+        )
+
+    def test_login_attempts(self):
+        self.assertThrottledAfter(
+            2,
+            lambda: self.client.post(
+                "/api/v1/auth/login/",
+                {"email": "alice@example.com", "password": "wrong-password"},
+                format="json",
+            ),
+        )
+
+
+class ProductionSettingsTests(SimpleTestCase):
+    def test_missing_secret_key_is_refused(self):
+        env = {
+            **os.environ,
+            "DJANGO_SETTINGS_PROFILE": "production",
+            "DJANGO_ALLOWED_HOSTS": "api.example.com",
+            "DJANGO_SECRET_KEY": "",
+        }
+        result = subprocess.run(
+            [sys.executable, "manage.py", "check"],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn("DJANGO_SECRET_KEY must be set in production", result.stderr)
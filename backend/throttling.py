@@ -0,0 +1,163 @@
+"""
+Token bucket throttles for the API.
+
+Rates come from REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"] in the usual
+"<requests>/<period>" form: the bucket holds that many tokens and refills at
+that rate, so short bursts up to the limit are allowed. Buckets live in
+TOKEN_BUCKET_STORE, in-process by default.
+"""
+
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+
+class LocalBucketStore:
+    """
+    Buckets kept in this process. Checks cost a dict lookup under a lock, but
+    each worker enforces the limit on its own.
+    """
+
+    def __init__(self, max_buckets=100000):
+        self.max_buckets = max_buckets
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_rate):
+        """
+        Take a token from the bucket, returning 0 when allowed or the seconds
+        until a token is available otherwise.
+        """
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_buckets:
+                    self._sweep(now)
+                tokens = capacity
+            else:
+                tokens, updated, _ = bucket
+                tokens = min(capacity, tokens + (now - updated) * refill_rate)
+
+            if tokens < 1:
+                wait = (1 - tokens) / refill_rate
+            else:
+                tokens -= 1
+                wait = 0
+            full_at = now + (capacity - tokens) / refill_rate
+            self._buckets[key] = (tokens, now, full_at)
+            return wait
+
+    def _sweep(self, now):
+        # Buckets that have refilled completely carry no state, drop them.
+        self._buckets = {
+            key: bucket for key, bucket in self._buckets.items() if bucket[2] > now
+        }
+
+
+class CacheBucketStore:
+    """
+    Buckets kept in a Django cache shared by all workers (TOKEN_BUCKET_CACHE).
+    The read-modify-write isn't atomic, so concurrent requests from one client
+    can occasionally get a token more than the limit.
+    """
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, "TOKEN_BUCKET_CACHE", "default")]
+
+    def consume(self, key, capacity, refill_rate):
+        now = time.time()
+        tokens, updated = self.cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * refill_rate)
+        if tokens < 1:
+            return (1 - tokens) / refill_rate
+        # the entry can expire once the bucket would be full again anyway
+        timeout = int((capacity - tokens + 1) / refill_rate) + 1
+        self.cache.set(key, (tokens - 1, now), timeout)
+        return 0
+
+
+@lru_cache(maxsize=None)
+def get_store():
+    backend = getattr(
+        settings, "TOKEN_BUCKET_STORE", "backend.throttling.LocalBucketStore"
+    )
+    return import_string(backend)()
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """Turn "10/min" into a (capacity, tokens per second) pair."""
+    num, period = rate.split("/")
+    duration = {"s": 1, "m": 60, "h": 3600, "d": 86400}[period[0]]
+    return int(num), int(num) / duration
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Base class; subclasses set `scope` and say who a bucket belongs to in
+    `get_ident_key`. Requests without a configured rate aren't throttled.
+    """
+
+    scope = None
+
+    def __init__(self):
+        self.retry_after = None
+
+    def get_ident_key(self, request):
+        raise NotImplementedError(".get_ident_key() must be overridden")
+
+    def allow_request(self, request, view):
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        if rate is None:
+            return True
+
+        ident = self.get_ident_key(request)
+        if ident is None:
+            return True
+
+        capacity, refill_rate = parse_rate(rate)
+        wait = get_store().consume(
+            f"bucket:{self.scope}:{ident}", capacity, refill_rate
+        )
+        if wait:
+            self.retry_after = wait
+            return False
+        return True
+
+    def wait(self):
+        return self.retry_after
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """One bucket per authenticated user, anonymous requests aren't limited."""
+
+    scope = "user"
+
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return f"user:{request.user.pk}"
+        return None
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    """One bucket per client IP, for endpoints used before logging in."""
+
+    scope = "ip"
+
+    def get_ident_key(self, request):
+        return f"ip:{self.get_ident(request)}"
+
+
+class PDFThrottle(UserTokenBucketThrottle):
+    scope = "pdf"
+
+
+class LoginThrottle(IPTokenBucketThrottle):
+    scope = "login"
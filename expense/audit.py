@@ -0,0 +1,126 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import AuditEntry
+
+logger = logging.getLogger(__name__)
+
+AUDITED_FIELDS = ("title", "amount", "currency", "split_type")
+
+
+def snapshot(expense, splits):
+    """
+    JSON-ready state of an expense, `splits` being (username, value) pairs.
+    """
+    # imported here because the serializers import this module
+    from .serializers import _decimal_representation
+
+    state = {field: getattr(expense, field) for field in AUDITED_FIELDS}
+    state["amount"] = _decimal_representation(state["amount"])
+    state["participants"] = [
+        {"user": username, "value": _decimal_representation(value)}
+        for username, value in splits
+    ]
+    return state
+
+
+def diff(old, new):
+    """{field: [old, new]} for every field that changed."""
+    return {
+        field: [old.get(field), new.get(field)]
+        for field in new.keys() | old.keys()
+        if old.get(field) != new.get(field)
+    }
+
+
+class SyncWriter:
+    """Writes each committed batch of entries straight away, in one insert."""
+
+    def submit(self, entries):
+        AuditEntry.objects.bulk_create(entries)
+
+    def flush(self):
+        pass
+
+
+class BackgroundWriter:
+    """
+    Writes entries from a daemon thread, collecting whatever arrives within
+    `interval` seconds into a single insert. The request only pays for putting
+    its entries on a queue. Entries still queued when the process is killed
+    are lost; a normal exit flushes them.
+    """
+
+    def __init__(self, batch_size=500, interval=1.0):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def submit(self, entries):
+        self.queue.put(entries)
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="audit-writer", daemon=True
+                    )
+                    self._thread.start()
+
+    def flush(self):
+        """Block until everything submitted so far is written."""
+        if self._thread is not None:
+            self.queue.join()
+
+    def _run(self):
+        while True:
+            batches = [self.queue.get()]
+            entries = list(batches[0])
+            deadline = time.monotonic() + self.interval
+            while len(entries) < self.batch_size:
+                try:
+                    batch = self.queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                batches.append(batch)
+                entries.extend(batch)
+            self._write(entries)
+            for _ in batches:
+                self.queue.task_done()
+
+    def _write(self, entries):
+        try:
+            AuditEntry.objects.bulk_create(entries, batch_size=self.batch_size)
+        except Exception:
+            logger.exception("Lost %d audit entries", len(entries))
+        finally:
+            close_old_connections()
+
+
+@lru_cache(maxsize=None)
+def get_writer():
+    backend = getattr(settings, "AUDIT_LOG_WRITER", "expense.audit.BackgroundWriter")
+    return import_string(backend)()
+
+
+def audit_on_commit(entries):
+    """
+    Hand entries to the writer once the surrounding transaction commits, so
+    changes that were rolled back leave no trace. Timestamps are taken now,
+    not when the writer gets to them.
+    """
+    now = timezone.now()
+    for entry in entries:
+        entry.created = now
+    transaction.on_commit(lambda: get_writer().submit(entries))
@@ -0,0 +1,165 @@
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+
+class LocalLRU:
+    """
+    Per-process LRU tier bounded by the total size of the pickled values.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+class ExpenseListCache:
+    """
+    Two-tier cache for the per-user expense lists.
+
+    Every user has a generation counter in the shared tier which is part of
+    each cache key, so invalidating all of a user's lists is a single counter
+    bump and stale entries simply age out. The shared tier must be a backend
+    all workers see (e.g. Redis) for bumps to reach every process; with a
+    per-process backend the cache is off.
+    """
+
+    def __init__(self, local_max_bytes, shared_alias, timeout):
+        self.local = LocalLRU(local_max_bytes)
+        self.shared_alias = shared_alias
+        self.timeout = timeout
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    @property
+    def enabled(self):
+        """
+        False when the shared tier lives in each process. Bumps from other
+        workers and from management commands would never arrive there, so
+        lists would be served stale until they time out.
+        """
+        return not isinstance(self.shared, (LocMemCache, DummyCache))
+
+    def _generation_key(self, user_id):
+        return f"expense:gen:{user_id}"
+
+    def generation(self, user_id):
+        key = self._generation_key(user_id)
+        generation = self.shared.get(key)
+        if generation is None:
+            # Seeding from the clock rather than 0 keeps entries cached before
+            # an eviction of the counter from ever matching again.
+            self.shared.add(key, time.time_ns(), timeout=None)
+            generation = self.shared.get(key)
+        return generation
+
+    def key(self, user_id, name, params=None):
+        """
+        Key for one list of one user. Computed before the list is built so a
+        bump that races with building it makes the stored entry unreachable.
+        None when the cache is off.
+        """
+        if not self.enabled:
+            return None
+        query = ""
+        if params:
+            query = "&".join(
+                f"{param}={value}"
+                for param in sorted(params)
+                for value in params.getlist(param)
+            )
+        digest = hashlib.md5(query.encode()).hexdigest()
+        return f"expense:list:{name}:{user_id}:{self.generation(user_id)}:{digest}"
+
+    def get(self, key):
+        if key is None:
+            self.misses += 1
+            return None
+
+        value = self.local.get(key)
+        if value is not None:
+            self.local_hits += 1
+            return pickle.loads(value)
+
+        value = self.shared.get(key)
+        if value is not None:
+            self.shared_hits += 1
+            self.local.set(key, value)
+            return pickle.loads(value)
+
+        self.misses += 1
+        return None
+
+    def set(self, key, data):
+        if key is None:
+            return
+        value = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+        self.local.set(key, value)
+        self.shared.set(key, value, timeout=self.timeout)
+
+    def bump(self, user_ids):
+        if not self.enabled:
+            return
+        for user_id in user_ids:
+            key = self._generation_key(user_id)
+            try:
+                self.shared.incr(key)
+            except ValueError:
+                self.shared.add(key, time.time_ns(), timeout=None)
+
+    def stats(self):
+        return {
+            "local_hits": self.local_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "local_bytes": self.local.size,
+        }
+
+
+_config = getattr(settings, "EXPENSE_LIST_CACHE", {})
+
+expense_list_cache = ExpenseListCache(
+    local_max_bytes=_config.get("LOCAL_MAX_BYTES", 16 * 1024 * 1024),
+    shared_alias=_config.get("SHARED_ALIAS", "default"),
+    timeout=_config.get("TIMEOUT", 300),
+)
+
+
+def invalidate_on_commit(user_ids):
+    user_ids = set(user_ids)
+    transaction.on_commit(lambda: expense_list_cache.bump(user_ids))
@@ -0,0 +1,92 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+EXPENSE_CREATED = "expense.created"
+EXPENSE_UPDATED = "expense.updated"
+EXPENSE_DELETED = "expense.deleted"
+
+
+class Subscription:
+    """
+    A single subscriber's mailbox. Events are handed over from whatever thread
+    published them onto the subscriber's own event loop, so the request thread
+    never blocks on a slow client.
+    """
+
+    def __init__(self, user_id, maxsize=100):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def deliver(self, event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        # A client that stopped reading loses events instead of growing memory.
+        if not self.queue.full():
+            self.queue.put_nowait(event)
+
+    async def get(self, timeout=None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class LocalBroker:
+    """
+    In-process pub/sub, good for a single ASGI worker or for local development.
+    Any other backend only has to provide the same three methods.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id)
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def publish(self, user_ids, event):
+        with self._lock:
+            targets = [
+                subscription
+                for user_id in user_ids
+                for subscription in self._subscribers.get(user_id, ())
+            ]
+        for subscription in targets:
+            subscription.deliver(event)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    backend = getattr(settings, "EXPENSE_EVENTS_BROKER", "expense.events.LocalBroker")
+    return import_string(backend)()
+
+
+def publish_on_commit(event_type, expense_id, user_ids):
+    """
+    Notify every affected participant once the surrounding transaction commits,
+    so nobody is told about a change that was rolled back.
+    """
+    event = {"event": event_type, "expense": expense_id}
+    user_ids = set(user_ids)
+    transaction.on_commit(lambda: get_broker().publish(user_ids, event))
+
+
+def format_sse(event):
+    return f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
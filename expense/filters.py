@@ -0,0 +1,48 @@
+import django_filters
+
+from .models import ArchivedExpense, Expense
+from .search import search_titles
+
+
+class ExpenseFilter(django_filters.FilterSet):
+    """
+    Query parameters accepted by the expense list endpoints.
+
+    `search` matches words in the title, `created_after`/`created_before` take
+    dates, `amount_min`/`amount_max` bound the amount and `counterparty` keeps
+    expenses that user takes part in.
+    """
+
+    search = django_filters.CharFilter(method="filter_search")
+    created = django_filters.DateFromToRangeFilter()
+    amount = django_filters.RangeFilter()
+    split_type = django_filters.ChoiceFilter(choices=Expense.SPLIT_TYPE)
+    currency = django_filters.CharFilter(method="filter_currency")
+    counterparty = django_filters.CharFilter(field_name="expensesplit__user__username")
+
+    class Meta:
+        model = Expense
+        fields = [
+            "search",
+            "created",
+            "amount",
+            "split_type",
+            "currency",
+            "counterparty",
+        ]
+
+    def filter_search(self, queryset, name, value):
+        return search_titles(queryset, value)
+
+    def filter_currency(self, queryset, name, value):
+        return queryset.filter(currency=value.upper())
+
+
+class ArchivedExpenseFilter(ExpenseFilter):
+    """Same parameters over the archive, which has no full-text index."""
+
+    class Meta(ExpenseFilter.Meta):
+        model = ArchivedExpense
+
+    def filter_search(self, queryset, name, value):
+        return queryset.filter(title__icontains=value)
@@ -0,0 +1,81 @@
+import threading
+import time
+from bisect import bisect_right
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+
+from .models import FxRate
+
+
+class MissingRate(Exception):
+    pass
+
+
+class RateTable:
+    """
+    In-memory copy of the FX rates table.
+
+    Every rate is the value of one unit of a currency in FX_BASE_CURRENCY as of
+    a date, so converting between any two currencies on a day is two lookups.
+    Lookups are memoized per (currency, day), which makes converting many rows
+    a dict hit each rather than a search or a query.
+    """
+
+    def __init__(self, rows, base):
+        self.base = base
+        self._dates = defaultdict(list)
+        self._rates = defaultdict(list)
+        for currency, as_of, rate in sorted(rows):
+            self._dates[currency].append(as_of)
+            self._rates[currency].append(rate)
+        self._memo = {}
+
+    def knows(self, currency):
+        """Whether amounts in `currency` can be converted."""
+        return currency == self.base or currency in self._dates
+
+    def rate(self, currency, day):
+        if currency == self.base:
+            return Decimal(1)
+        key = (currency, day)
+        try:
+            return self._memo[key]
+        except KeyError:
+            pass
+
+        dates = self._dates.get(currency)
+        if not dates:
+            raise MissingRate(f"No exchange rate for {currency}.")
+        # latest rate published on or before the day, or the earliest known one
+        index = max(bisect_right(dates, day) - 1, 0)
+        rate = self._memo[key] = self._rates[currency][index]
+        return rate
+
+    def convert(self, amount, from_currency, to_currency, day):
+        if from_currency == to_currency:
+            return amount
+        return amount * self.rate(from_currency, day) / self.rate(to_currency, day)
+
+
+_lock = threading.Lock()
+_table = None
+_loaded_at = 0.0
+
+
+def get_rate_table():
+    """
+    Process-wide rate table, reloaded after FX_RATES_TTL seconds so rates
+    loaded by `manage.py load_fx_rates` are picked up by running workers.
+    """
+    global _table, _loaded_at
+    ttl = getattr(settings, "FX_RATES_TTL", 300)
+    with _lock:
+        if _table is None or time.monotonic() - _loaded_at > ttl:
+            _table = RateTable(
+                FxRate.objects.values_list("currency", "as_of", "rate"),
+                settings.FX_BASE_CURRENCY,
+            )
+            _loaded_at = time.monotonic()
+        return _table
@@ -0,0 +1,100 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+
+def _fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.path}\n{body}".encode()).hexdigest()
+
+
+def _claim(request, key, fingerprint):
+    """
+    Insert the key, or return the row that beat us to it. Rows that expired,
+    or were left unfinished by a crashed request, are removed and re-claimed.
+    Returns (None, False) if the key kept changing hands.
+    """
+    now = timezone.now()
+    for _ in range(3):
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user=request.user,
+                    key=key,
+                    fingerprint=fingerprint,
+                    expires_at=now + settings.IDEMPOTENCY_KEY_TTL,
+                )
+            return record, True
+        except IntegrityError:
+            pass
+
+        stale = Q(expires_at__lte=now) | Q(
+            status_code__isnull=True,
+            created__lte=now - settings.IDEMPOTENCY_KEY_LOCK_TIMEOUT,
+        )
+        expired = IdempotencyKey.objects.filter(stale, user=request.user, key=key)
+        if expired.delete()[0]:
+            continue
+        try:
+            return IdempotencyKey.objects.get(user=request.user, key=key), False
+        except IdempotencyKey.DoesNotExist:
+            # the request holding it failed and let go of it since
+            continue
+
+    return None, False
+
+
+def idempotent(request, handler):
+    """
+    Run `handler` once per `Idempotency-Key` header and user, replaying the
+    stored response for repeats without validating or writing anything.
+    Requests without the header are passed straight through.
+    """
+    key = request.headers.get("Idempotency-Key")
+    if not key:
+        return handler()
+    if len(key) > 255:
+        return Response(
+            {"detail": "Idempotency-Key must be at most 255 characters."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    fingerprint = _fingerprint(request)
+    record, claimed = _claim(request, key, fingerprint)
+
+    if not claimed:
+        if record is not None and record.fingerprint != fingerprint:
+            return Response(
+                {"detail": "Idempotency-Key was already used with another request."},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        if record is None or record.status_code is None:
+            return Response(
+                {"detail": "A request with this Idempotency-Key is in progress."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        response = Response(record.response, status=record.status_code)
+        response["Idempotent-Replayed"] = "true"
+        return response
+
+    try:
+        # The response is recorded in the transaction that writes the expense,
+        # so a key is never left unfinished once its expense exists.
+        with transaction.atomic():
+            response = handler()
+            record.status_code = response.status_code
+            record.response = response.data
+            record.save(update_fields=["status_code", "response"])
+    except Exception:
+        # failed requests aren't remembered, so the client can fix and retry
+        record.delete()
+        raise
+    return response
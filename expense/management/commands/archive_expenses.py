@@ -0,0 +1,84 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from expense.cache import invalidate_on_commit
+from expense.models import (
+    ArchivedExpense,
+    ArchivedExpenseSplit,
+    Expense,
+    ExpenseSplit,
+    add_months,
+)
+
+EXPENSE_FIELDS = [
+    "id",
+    "owner_id",
+    "title",
+    "amount",
+    "currency",
+    "split_type",
+    "created",
+    "updated",
+    "recurring_id",
+    "period",
+    "deleted_at",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Move settled expenses (not changed for --months, deleted or not) and "
+        "their splits into the archive tables"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--months", type=int, default=12)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        cutoff = add_months(now, -options["months"], now.day)
+        count = 0
+        # Each batch moves in its own short transaction, so the hot tables are
+        # never locked for longer than one batch takes.
+        while moved := self.archive_batch(cutoff, options["batch_size"]):
+            count += moved
+
+        self.stdout.write(
+            f"Archived {count} expenses changed before {cutoff:%Y-%m-%d}."
+        )
+
+    @transaction.atomic
+    def archive_batch(self, cutoff, batch_size):
+        expenses = list(
+            Expense.all_objects.select_for_update()
+            .filter(updated__lt=cutoff)
+            .order_by("id")
+            .values(*EXPENSE_FIELDS)[:batch_size]
+        )
+        if not expenses:
+            return 0
+        ids = [expense["id"] for expense in expenses]
+        splits = list(
+            ExpenseSplit.objects.filter(expense_id__in=ids).values(
+                "id", "expense_id", "user_id", "value"
+            )
+        )
+
+        ArchivedExpense.objects.bulk_create(
+            ArchivedExpense(**expense) for expense in expenses
+        )
+        ArchivedExpenseSplit.objects.bulk_create(
+            ArchivedExpenseSplit(**split) for split in splits
+        )
+        ExpenseSplit.objects.filter(expense_id__in=ids).delete()
+        Expense.all_objects.filter(id__in=ids).delete()
+
+        # The rollups keep counting archived expenses, only the cached lists
+        # of everyone involved change.
+        invalidate_on_commit(
+            {expense["owner_id"] for expense in expenses}
+            | {split["user_id"] for split in splits}
+        )
+        return len(expenses)
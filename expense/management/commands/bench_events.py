@@ -0,0 +1,122 @@
+import asyncio
+import json
+import statistics
+import time
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from backend.benchmarks import rolled_back, rss_bytes
+from expense.events import EXPENSE_UPDATED, get_broker
+from user.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Open many idle /expenses/events streams in this process and measure "
+        "the memory each one holds and how long events take to reach them all"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--subscribers", type=int, default=10000)
+        parser.add_argument(
+            "--users",
+            type=int,
+            default=100,
+            help="Spread subscribers over this many users",
+        )
+        parser.add_argument("--events", type=int, default=5)
+
+    def handle(self, *args, **options):
+        # as the test runner does, so development settings accept the client
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "testserver"]
+        # Database calls of the views come back to this thread, inside the
+        # transaction.
+        with rolled_back():
+            async_to_sync(self.run)(options)
+
+    async def run(self, options):
+        users = await sync_to_async(self.create_users)(options["users"])
+        tokens = [str(AccessToken.for_user(user)) for user in users]
+        count = options["subscribers"]
+        client = AsyncClient()
+
+        rss_start = rss_bytes()
+        start = time.perf_counter()
+        streams = []
+        for i in range(count):
+            response = await client.get(
+                "/api/v1/expenses/events",
+                headers={"Authorization": f"Bearer {tokens[i % len(tokens)]}"},
+            )
+            if response.status_code != 200:
+                raise CommandError(f"Subscribing returned {response.status_code}")
+            stream = aiter(response.streaming_content)
+            # the ": connected" comment, sent once subscribed
+            await anext(stream)
+            streams.append(stream)
+        opened = time.perf_counter() - start
+        rss_open = rss_bytes()
+
+        published = {}
+        latencies = []
+        received = asyncio.Event()
+
+        async def read(stream):
+            async for chunk in stream:
+                if chunk.startswith(b":"):
+                    continue
+                data = json.loads(chunk.split(b"data: ", 1)[1])
+                latencies.append(time.perf_counter() - published[data["expense"]])
+                if len(latencies) == len(published) * count:
+                    received.set()
+
+        readers = [asyncio.create_task(read(stream)) for stream in streams]
+        user_ids = [user.id for user in users]
+        broker = get_broker()
+        publish = sync_to_async(broker.publish)
+        try:
+            for event in range(options["events"]):
+                received.clear()
+                published[event] = time.perf_counter()
+                # from a request thread, as publish_on_commit does
+                await publish(user_ids, {"event": EXPENSE_UPDATED, "expense": event})
+                try:
+                    await asyncio.wait_for(received.wait(), 60)
+                except asyncio.TimeoutError:
+                    raise CommandError(
+                        f"Only {len(latencies)} of {len(published) * count} "
+                        "events arrived within 60s"
+                    )
+        finally:
+            for reader in readers:
+                reader.cancel()
+            await asyncio.gather(*readers, return_exceptions=True)
+
+        latencies.sort()
+        self.stdout.write(
+            f"{count:,} subscribers opened in {opened:.1f}s, "
+            f"RSS {rss_start / 2**20:.1f}MB -> {rss_open / 2**20:.1f}MB, "
+            f"{(rss_open - rss_start) / count / 1024:.1f}KB per subscriber"
+        )
+        self.stdout.write(
+            f"{len(latencies):,} deliveries: "
+            f"median {statistics.median(latencies) * 1000:.1f}ms, "
+            f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f}ms, "
+            f"max {latencies[-1] * 1000:.1f}ms"
+        )
+
+    def create_users(self, count):
+        return User.objects.bulk_create(
+            User(
+                username=f"bench_events_{i}",
+                email=f"bench_events_{i}@example.com",
+                mobile_number=f"{i:010d}",
+                first_name="Bench",
+                last_name=str(i),
+            )
+            for i in range(count)
+        )
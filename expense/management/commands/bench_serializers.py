@@ -0,0 +1,74 @@
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from backend.benchmarks import rolled_back
+from expense.models import Expense, ExpenseSplit
+from expense.renderers import FastJSONRenderer
+from expense.serializers import ExpenseSerializer, serialize_expenses
+from user.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare list serialization throughput of ExpenseSerializer and the fast path"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--expenses", type=int, default=10000)
+        parser.add_argument("--participants", type=int, default=3)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            self.run(options)
+
+    def run(self, options):
+        users = User.objects.bulk_create(
+            User(
+                username=f"bench_{i}",
+                email=f"bench_{i}@example.com",
+                mobile_number=f"{i:010d}",
+                first_name="Bench",
+                last_name=str(i),
+            )
+            for i in range(options["participants"])
+        )
+        expenses = Expense.objects.bulk_create(
+            Expense(
+                owner=users[0],
+                title=f"Expense {i}",
+                amount=100 * len(users),
+                split_type=Expense.EQUAL,
+            )
+            for i in range(options["expenses"])
+        )
+        ExpenseSplit.objects.bulk_create(
+            ExpenseSplit(expense=expense, user=user, value=100)
+            for expense in expenses
+            for user in users
+        )
+        queryset = Expense.objects.filter(owner=users[0]).order_by("-updated")
+
+        def current():
+            prefetched = queryset.prefetch_related("expensesplit_set__user")
+            data = ExpenseSerializer(prefetched, many=True).data
+            return JSONRenderer().render(data)
+
+        def fast():
+            return FastJSONRenderer().render(serialize_expenses(queryset))
+
+        if current() != fast():
+            self.stderr.write("Fast path output differs from ExpenseSerializer")
+
+        for name, func in (("ExpenseSerializer", current), ("fast path", fast)):
+            best = min(self.timed(func) for _ in range(options["repeat"]))
+            self.stdout.write(
+                f"{name:>18}: {best:.3f}s, {options['expenses'] / best:,.0f} expenses/s"
+            )
+
+    def timed(self, func):
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start
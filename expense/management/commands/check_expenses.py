@@ -0,0 +1,291 @@
+import json
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import ROUND_DOWN, Decimal
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, F, Max, Min, Q, Sum
+from django.db.models.functions import Abs
+
+from expense.audit import audit_on_commit, diff, snapshot
+from expense.cache import invalidate_on_commit
+from expense.events import EXPENSE_UPDATED, publish_on_commit
+from expense.models import AuditEntry, Expense, ExpenseSplit
+from expense.rollups import record_expenses
+
+CENTS = Decimal("0.01")
+HUNDRED = Decimal(100)
+# largest value of Expense.amount
+MAX_AMOUNT = Decimal("99999999.99")
+
+EXACT_TOTAL = "exact_total"
+PERCENTAGE_TOTAL = "percentage_total"
+OWNER_MISSING = "owner_missing"
+
+
+def violations(split_type, amount, total, owner_included):
+    """The invariants of ExpenseSerializer that an expense breaks."""
+    found = []
+    if split_type == Expense.EXACT and total != amount:
+        found.append(EXACT_TOTAL)
+    elif split_type == Expense.PERCENTAGE and total != HUNDRED:
+        found.append(PERCENTAGE_TOTAL)
+    if not owner_included:
+        found.append(OWNER_MISSING)
+    return found
+
+
+def repairable(split_type, total, found):
+    """
+    Whether every violation in `found` has a repair: EXACT amounts are set to
+    the total of their splits, PERCENTAGE splits are scaled to total 100 and
+    missing owners get a split of 0. EQUAL shares would no longer be equal
+    with an owner of 0, so those are left to a person.
+    """
+    if EXACT_TOTAL in found and not 0 < total <= MAX_AMOUNT:
+        return False
+    if PERCENTAGE_TOTAL in found and total <= 0:
+        return False
+    if OWNER_MISSING in found and split_type == Expense.EQUAL:
+        return False
+    return True
+
+
+def rescale(values):
+    """Percentages scaled to total exactly 100, the rounding remainder going to the largest."""
+    total = sum(values)
+    scaled = [(value * HUNDRED / total).quantize(CENTS, ROUND_DOWN) for value in values]
+    largest = max(range(len(scaled)), key=scaled.__getitem__)
+    scaled[largest] += HUNDRED - sum(scaled)
+    return scaled
+
+
+def scan(start=None, stop=None):
+    """
+    Expenses breaking an invariant, with the id range [start, stop) if given,
+    found by a single aggregate over expenses and their splits grouped by
+    expense. Only the offending rows leave the database.
+    """
+    expenses = Expense.objects.all()
+    if start is not None:
+        expenses = expenses.filter(id__gte=start, id__lt=stop)
+    # Half a cent of slack because SQLite adds decimals up as floats, the
+    # totals come back rounded to cents and are compared exactly again.
+    slack = CENTS / 2
+    rows = (
+        expenses.values("id", "owner_id", "split_type", "amount")
+        .annotate(
+            total=Sum(
+                "expensesplit__value",
+                default=0,
+                output_field=DecimalField(max_digits=20, decimal_places=2),
+            ),
+            splits=Count("expensesplit"),
+            owner_splits=Count(
+                "expensesplit", filter=Q(expensesplit__user_id=F("owner_id"))
+            ),
+        )
+        .annotate(
+            amount_off=Abs(F("total") - F("amount")),
+            percentage_off=Abs(F("total") - HUNDRED),
+        )
+        .filter(
+            Q(split_type=Expense.EXACT, amount_off__gte=slack)
+            | Q(split_type=Expense.PERCENTAGE, percentage_off__gte=slack)
+            | Q(owner_splits=0)
+        )
+        .order_by("id")
+    )
+    for row in rows.iterator(chunk_size=2000):
+        row["total"] = row["total"].quantize(CENTS)
+        found = violations(
+            row["split_type"], row["amount"], row["total"], row["owner_splits"]
+        )
+        if found:
+            row["violations"] = found
+            yield row
+
+
+def scan_chunk(id_range):
+    try:
+        return list(scan(*id_range))
+    finally:
+        # each pool thread has its own connection
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Find expenses whose splits break the invariants enforced on write: "
+        "EXACT splits adding up to the amount, PERCENTAGE splits to 100 and the "
+        "owner being a participant. Writes one JSON line per expense found and "
+        "with --repair fixes the ones that can be. Deleted and archived "
+        "expenses are not checked."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Scan id ranges of --chunk-size expenses in this many threads",
+        )
+        parser.add_argument("--chunk-size", type=int, default=100000)
+        parser.add_argument("--repair", action="store_true")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--output", help="Write the report to this file instead of stdout"
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        out = open(options["output"], "w") if options["output"] else self.stdout
+        try:
+            found, repaired = self.run(out, options)
+        finally:
+            if options["output"]:
+                out.close()
+
+        # stdout may be the report, so the summary goes to stderr
+        summary = f"Found {found} expenses breaking invariants"
+        if options["repair"]:
+            summary += f", repaired {repaired}"
+        self.stderr.write(f"{summary} in {time.perf_counter() - start:.1f}s.")
+
+    def run(self, out, options):
+        if options["workers"] > 1:
+            rows = self.scan_parallel(options["workers"], options["chunk_size"])
+        else:
+            rows = scan()
+
+        if not options["repair"]:
+            found = 0
+            for row in rows:
+                self.write(out, row)
+                found += 1
+            return found, 0
+
+        # Repairs wait for the scan to finish: a write transaction mustn't be
+        # queued behind the scan's reads, or block them, on SQLite.
+        rows = list(rows)
+        repaired = 0
+        batches = iter(rows)
+        while batch := list(islice(batches, options["batch_size"])):
+            fixed = self.repair([row["id"] for row in batch])
+            repaired += len(fixed)
+            for row in batch:
+                self.write(out, row, repaired=row["id"] in fixed)
+        return len(rows), repaired
+
+    def scan_parallel(self, workers, chunk_size):
+        bounds = Expense.objects.aggregate(first=Min("id"), last=Max("id"))
+        if bounds["first"] is None:
+            return
+        ranges = [
+            (start, start + chunk_size)
+            for start in range(bounds["first"], bounds["last"] + 1, chunk_size)
+        ]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # in id order, whichever chunk finishes first
+            for rows in pool.map(scan_chunk, ranges):
+                yield from rows
+
+    def write(self, out, row, **extra):
+        record = {
+            "expense": row["id"],
+            "owner": row["owner_id"],
+            "split_type": row["split_type"],
+            "amount": str(row["amount"]),
+            "total": str(row["total"]),
+            "splits": row["splits"],
+            "violations": row["violations"],
+            **extra,
+        }
+        out.write(json.dumps(record) + "\n")
+
+    @transaction.atomic
+    def repair(self, expense_ids):
+        """
+        Repair the given expenses that still break an invariant once locked,
+        as the API would have written them, and return the ids repaired.
+        """
+        expenses = list(
+            Expense.objects.select_for_update()
+            .filter(id__in=expense_ids)
+            .order_by("id")
+        )
+        splits = defaultdict(list)
+        for split in (
+            ExpenseSplit.objects.filter(expense_id__in=expense_ids)
+            .select_related("user")
+            .order_by("id")
+        ):
+            splits[split.expense_id].append(split)
+
+        plans = []
+        for expense in expenses:
+            total = sum((split.value for split in splits[expense.id]), Decimal(0))
+            found = violations(
+                expense.split_type,
+                expense.amount,
+                total,
+                any(split.user_id == expense.owner_id for split in splits[expense.id]),
+            )
+            if found and repairable(expense.split_type, total, found):
+                plans.append((expense, total, found))
+
+        rescaled = [
+            expense.id for expense, _, found in plans if PERCENTAGE_TOTAL in found
+        ]
+        record_expenses(rescaled, sign=-1)
+
+        changed, created, entries, participant_ids = [], [], [], set()
+        for expense, total, found in plans:
+            expense_splits = splits[expense.id]
+            old_state = snapshot(
+                expense,
+                [(split.user.username, split.value) for split in expense_splits],
+            )
+            if EXACT_TOTAL in found:
+                expense.amount = total
+            if PERCENTAGE_TOTAL in found:
+                values = rescale([split.value for split in expense_splits])
+                for split, value in zip(expense_splits, values):
+                    split.value = value
+                changed.extend(expense_splits)
+            if OWNER_MISSING in found:
+                split = ExpenseSplit(expense=expense, user=expense.owner, value=0)
+                expense_splits.append(split)
+                created.append(split)
+            expense.save(update_fields=["amount", "updated"])
+
+            entries.append(
+                AuditEntry(
+                    expense_id=expense.id,
+                    actor=None,
+                    action=AuditEntry.UPDATED,
+                    changes=diff(
+                        old_state,
+                        snapshot(
+                            expense,
+                            [
+                                (split.user.username, split.value)
+                                for split in expense_splits
+                            ],
+                        ),
+                    ),
+                )
+            )
+            user_ids = [split.user_id for split in expense_splits]
+            publish_on_commit(EXPENSE_UPDATED, expense.id, user_ids)
+            participant_ids.update(user_ids)
+
+        ExpenseSplit.objects.bulk_update(changed, ["value"])
+        ExpenseSplit.objects.bulk_create(created)
+        record_expenses(rescaled)
+        audit_on_commit(entries)
+        invalidate_on_commit(participant_ids)
+        return {expense.id for expense, _, _ in plans}
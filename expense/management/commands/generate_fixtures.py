@@ -0,0 +1,285 @@
+import random
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from expense.models import ArchivedExpense, ArchivedExpenseSplit, Expense, ExpenseSplit
+from user.models import User
+
+CENTS = Decimal("0.01")
+TITLES = (
+    "Dinner",
+    "Lunch",
+    "Groceries",
+    "Taxi",
+    "Rent",
+    "Electricity bill",
+    "Movie tickets",
+    "Coffee",
+    "Train tickets",
+    "Hotel",
+)
+
+USER_FIELDS = [
+    "id",
+    "username",
+    "email",
+    "mobile_number",
+    "first_name",
+    "last_name",
+    "password",
+    "home_currency",
+    "is_active",
+    "is_superuser",
+    "is_staff",
+    "created",
+    "updated",
+]
+EXPENSE_FIELDS = [
+    "id",
+    "owner",
+    "title",
+    "amount",
+    "currency",
+    "split_type",
+    "created",
+    "updated",
+]
+SPLIT_FIELDS = ["id", "expense", "user", "value"]
+PLAIN_TYPES = {"AutoField", "BigAutoField", "CharField", "ForeignKey"}
+# generated dates count back from here rather than from the clock, so a seed
+# gives the same data whenever it runs
+END_DATE = date(2025, 1, 1)
+
+
+def insert_rows(model, field_names, rows):
+    """
+    INSERT rows (tuples in `field_names` order) with one executemany. Skips
+    building model instances and bulk_create's per-value pre_save, which is
+    most of the cost at this volume.
+    """
+    # the wrapper itself, `connection` is a proxy resolved on every access
+    db = connections[DEFAULT_DB_ALIAS]
+    quote = db.ops.quote_name
+    fields = [model._meta.get_field(name) for name in field_names]
+    # ids, foreign keys and strings go to the driver as they are
+    adapt = [
+        None if field.get_internal_type() in PLAIN_TYPES else field for field in fields
+    ]
+    with db.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {quote(model._meta.db_table)} "
+            f"({', '.join(quote(field.column) for field in fields)}) "
+            f"VALUES ({', '.join(['%s'] * len(fields))})",
+            [
+                [
+                    value if field is None else field.get_db_prep_save(value, db)
+                    for field, value in zip(adapt, row)
+                ]
+                for row in rows
+            ],
+        )
+
+
+def next_id(*models):
+    """First id above every row of `models`, archived ones included."""
+    return 1 + max(
+        model._base_manager.aggregate(Max("id"))["id__max"] or 0 for model in models
+    )
+
+
+def partition(rng, total, parts):
+    """Split the integer `total` into `parts` random positive integers."""
+    cuts = sorted(rng.sample(range(1, total), parts - 1))
+    return [b - a for a, b in zip([0] + cuts, cuts + [total])]
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate users, expenses and splits of all split types for load and "
+        "migration testing. The same --seed always generates the same data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10000)
+        parser.add_argument("--expenses", type=int, default=100000)
+        parser.add_argument("--max-participants", type=int, default=5)
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=730,
+            help="Spread expenses over this many days before --end-date",
+        )
+        parser.add_argument(
+            "--end-date",
+            type=date.fromisoformat,
+            default=END_DATE,
+            help=f"Expenses are dated before this day (default: {END_DATE})",
+        )
+        parser.add_argument("--currencies", default=Expense.DEFAULT_CURRENCY)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--prefix",
+            default="fixture_",
+            help="Usernames and emails start with this, change it to generate "
+            "a second set into the same database",
+        )
+        parser.add_argument("--password", default="fixture-password")
+        parser.add_argument(
+            "--skip-rollups",
+            action="store_true",
+            help="Don't rebuild the spend rollups afterwards",
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        options["end"] = timezone.make_aware(
+            datetime.combine(options["end_date"], datetime.min.time())
+        )
+        start = time.perf_counter()
+
+        user_ids = self.create_users(options)
+        self.report("users", len(user_ids), start)
+
+        split_start = time.perf_counter()
+        splits = self.create_expenses(rng, user_ids, options)
+        self.report("expenses", options["expenses"], split_start)
+        self.stdout.write(f"{splits:>12,} splits")
+
+        # Ids were assigned here, so sequences that hand out ids (Postgres)
+        # must be moved past them.
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                no_style(), [User, Expense, ExpenseSplit]
+            ):
+                cursor.execute(sql)
+
+        if not options["skip_rollups"]:
+            call_command("rebuild_spend_rollups", stdout=self.stdout)
+        self.stdout.write(f"Done in {time.perf_counter() - start:.1f}s.")
+
+    def report(self, name, count, start):
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"{count:>12,} {name} in {elapsed:.1f}s ({count / elapsed:,.0f}/s)"
+        )
+
+    def create_users(self, options):
+        # Hashing once keeps this fast with any hasher, every fixture user
+        # logs in with --password.
+        password = make_password(options["password"])
+        prefix = options["prefix"]
+        end = options["end"]
+        first_id = next_id(User)
+        user_ids = list(range(first_id, first_id + options["users"]))
+
+        for offset in range(0, options["users"], options["batch_size"]):
+            stop = min(offset + options["batch_size"], options["users"])
+            with transaction.atomic():
+                insert_rows(
+                    User,
+                    USER_FIELDS,
+                    (
+                        (
+                            first_id + i,
+                            f"{prefix}{i}",
+                            f"{prefix}{i}@example.com",
+                            f"{i:010d}",
+                            "Fixture",
+                            str(i),
+                            password,
+                            Expense.DEFAULT_CURRENCY,
+                            True,
+                            False,
+                            False,
+                            end,
+                            end,
+                        )
+                        for i in range(offset, stop)
+                    ),
+                )
+        return user_ids
+
+    def create_expenses(self, rng, user_ids, options):
+        currencies = options["currencies"].upper().split(",")
+        # PERCENTAGE splits need at least 1% each
+        max_participants = min(options["max_participants"], len(user_ids), 100)
+        end = options["end"]
+        seconds = options["days"] * 86400
+        expense_id = next_id(Expense, ArchivedExpense)
+        split_id = next_id(ExpenseSplit, ArchivedExpenseSplit)
+        splits = 0
+
+        for offset in range(0, options["expenses"], options["batch_size"]):
+            count = min(options["batch_size"], options["expenses"] - offset)
+            expenses, expense_splits = [], []
+            for _ in range(count):
+                created = end - timedelta(seconds=rng.randrange(1, seconds + 1))
+                owner_id, amount, currency, split_type, participants = (
+                    self.random_expense(rng, user_ids, max_participants, currencies)
+                )
+                expenses.append(
+                    (
+                        expense_id,
+                        owner_id,
+                        f"{rng.choice(TITLES)} {rng.randrange(1000)}",
+                        amount,
+                        currency,
+                        split_type,
+                        created,
+                        created,
+                    )
+                )
+                for user_id, value in participants:
+                    expense_splits.append((split_id, expense_id, user_id, value))
+                    split_id += 1
+                expense_id += 1
+
+            with transaction.atomic():
+                insert_rows(Expense, EXPENSE_FIELDS, expenses)
+                insert_rows(ExpenseSplit, SPLIT_FIELDS, expense_splits)
+            splits += len(expense_splits)
+
+        return splits
+
+    def random_expense(self, rng, user_ids, max_participants, currencies):
+        """
+        Owner, amount, currency, split type and (user_id, value) splits of an
+        expense the API would accept: owner among the participants, EXACT
+        values adding up to the amount, PERCENTAGE to 100 and EQUAL shares all
+        the same.
+        """
+        size = rng.randint(1, max_participants)
+        participants = rng.sample(user_ids, size)
+        split_type = rng.choice((Expense.EXACT, Expense.EQUAL, Expense.PERCENTAGE))
+
+        if split_type == Expense.EQUAL:
+            share = rng.randint(100, 200000)
+            cents = share * size
+            values = [share] * size
+        else:
+            cents = rng.randint(max(size, 100), 1000000)
+            if split_type == Expense.EXACT:
+                values = partition(rng, cents, size)
+            else:
+                values = [100 * part for part in partition(rng, 100, size)]
+
+        return (
+            participants[0],
+            Decimal(cents) * CENTS,
+            rng.choice(currencies),
+            split_type,
+            [
+                (user_id, Decimal(value) * CENTS)
+                for user_id, value in zip(participants, values)
+            ],
+        )
@@ -0,0 +1,50 @@
+import csv
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from expense.models import FxRate
+
+
+class Command(BaseCommand):
+    help = (
+        "Load FX rates from a CSV file with `currency,as_of,rate` columns, where "
+        "rate is the value of one unit of the currency in FX_BASE_CURRENCY."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rates = []
+        with open(options["path"], newline="") as f:
+            for line, row in enumerate(csv.DictReader(f), start=2):
+                try:
+                    rate = Decimal(row["rate"].strip())
+                    # amounts are divided by rates when converted
+                    if not rate > 0:
+                        raise ValueError(f"rate must be positive, got {rate}")
+                    rates.append(
+                        FxRate(
+                            currency=row["currency"].strip().upper(),
+                            as_of=date.fromisoformat(row["as_of"].strip()),
+                            rate=rate,
+                        )
+                    )
+                except (KeyError, ValueError, InvalidOperation) as e:
+                    raise CommandError(f"Invalid row on line {line}: {e}")
+
+        with transaction.atomic():
+            # re-loading a file updates rates that were already published
+            FxRate.objects.bulk_create(
+                rates,
+                batch_size=options["batch_size"],
+                update_conflicts=True,
+                unique_fields=["currency", "as_of"],
+                update_fields=["rate"],
+            )
+
+        self.stdout.write(f"Loaded {len(rates)} FX rates.")
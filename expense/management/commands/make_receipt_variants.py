@@ -0,0 +1,34 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from expense.models import Receipt
+from expense.receipts import make_variants
+
+
+class Command(BaseCommand):
+    help = (
+        "Make the receipt variants that are missing, e.g. after changing "
+        "RECEIPT_VARIANTS or a restart that dropped queued work"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=settings.RECEIPT_WORKERS)
+
+    def handle(self, *args, **options):
+        hashes = Receipt.objects.values_list("sha256", flat=True).distinct()
+        failed = 0
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            futures = {
+                pool.submit(make_variants, sha256): sha256
+                for sha256 in hashes.iterator()
+            }
+            for future, sha256 in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"{sha256}: {e}")
+
+        self.stdout.write(f"Checked {len(futures)} receipt files, {failed} failed.")
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from expense.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Delete expired idempotency keys"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        expired = IdempotencyKey.objects.filter(expires_at__lte=now)
+        count = 0
+        # small batches on the expires_at index keep each delete short
+        while ids := list(
+            expired.values_list("id", flat=True)[: options["batch_size"]]
+        ):
+            count += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
+
+        self.stdout.write(f"Deleted {count} expired idempotency keys.")
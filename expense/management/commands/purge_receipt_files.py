@@ -0,0 +1,45 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from expense.models import Receipt
+from expense.receipts import root
+
+
+class Command(BaseCommand):
+    help = "Delete receipt files no receipt refers to anymore"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=3600,
+            help="Only delete files older than this many seconds, so uploads "
+            "that are being stored right now are left alone",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = time.time() - options["min_age"]
+        count = 0
+        for directory, _, names in os.walk(root()):
+            old = [
+                name
+                for name in names
+                if os.stat(os.path.join(directory, name)).st_mtime < cutoff
+            ]
+            if not old:
+                continue
+            # originals are named by their hash, variants "<hash>.<variant>.jpg";
+            # leftovers in tmp/ match no hash
+            referenced = set(
+                Receipt.objects.filter(
+                    sha256__in={name.split(".")[0] for name in old}
+                ).values_list("sha256", flat=True)
+            )
+            for name in old:
+                if name.split(".")[0] not in referenced:
+                    os.unlink(os.path.join(directory, name))
+                    count += 1
+
+        self.stdout.write(f"Deleted {count} receipt files.")
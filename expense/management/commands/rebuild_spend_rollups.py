@@ -0,0 +1,46 @@
+from collections import defaultdict
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from expense.models import ArchivedExpenseSplit, ExpenseSplit, SpendRollup
+from expense.rollups import spend_by_day
+
+
+class Command(BaseCommand):
+    help = "Rebuild the spend rollups behind /analytics/spend from all splits"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        # Archived expenses still count, so the same day can get rows from
+        # both tables; they're added up here, one entry per rollup row.
+        totals = defaultdict(lambda: [0, 0])
+        for splits in (ExpenseSplit.objects, ArchivedExpenseSplit.objects):
+            for user_id, day, currency, own, shared in spend_by_day(
+                splits.filter(expense__deleted_at__isnull=True)
+            ):
+                row = totals[user_id, day, currency]
+                row[0] += own
+                row[1] += shared
+
+        count = 0
+        rows = iter(totals.items())
+        with transaction.atomic():
+            SpendRollup.objects.all().delete()
+            while batch := list(islice(rows, options["batch_size"])):
+                SpendRollup.objects.bulk_create(
+                    SpendRollup(
+                        user_id=user_id,
+                        day=day,
+                        currency=currency,
+                        own=own,
+                        shared=shared,
+                    )
+                    for (user_id, day, currency), (own, shared) in batch
+                )
+                count += len(batch)
+
+        self.stdout.write(f"Rebuilt {count} spend rollups.")
@@ -0,0 +1,148 @@
+import time
+from collections import defaultdict
+from datetime import date, datetime
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from expense.audit import audit_on_commit, diff, snapshot
+from expense.cache import invalidate_on_commit
+from expense.events import EXPENSE_CREATED, publish_on_commit
+from expense.models import (
+    AuditEntry,
+    Expense,
+    ExpenseSplit,
+    RecurringExpense,
+    RecurringExpenseSplit,
+)
+from expense.rollups import record_expenses
+
+
+class Command(BaseCommand):
+    help = "Create the expenses of every recurring expense that is due"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date",
+            type=date.fromisoformat,
+            help="Materialize occurrences up to this day (default: today)",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--max-seconds",
+            type=float,
+            help="Stop starting new batches after this long; the rest is "
+            "picked up by the next run",
+        )
+
+    def handle(self, *args, **options):
+        today = options["date"] or timezone.localdate()
+        deadline = None
+        if options["max_seconds"] is not None:
+            deadline = time.monotonic() + options["max_seconds"]
+
+        templates = created = 0
+        while deadline is None or time.monotonic() < deadline:
+            with transaction.atomic():
+                # Due templates come straight off the partial next_run index and
+                # are locked so concurrent schedulers work on disjoint batches.
+                batch = list(
+                    RecurringExpense.objects.select_for_update(skip_locked=True)
+                    .filter(is_active=True, next_run__lte=today)
+                    .order_by("next_run")[: options["batch_size"]]
+                )
+                if not batch:
+                    break
+                created += self.materialize(batch, today)
+            templates += len(batch)
+
+        self.stdout.write(
+            f"Created {created} expenses from {templates} recurring expenses."
+        )
+
+    def materialize(self, batch, today):
+        splits = defaultdict(list)
+        for (
+            recurring_id,
+            user_id,
+            username,
+            value,
+        ) in RecurringExpenseSplit.objects.filter(recurring__in=batch).values_list(
+            "recurring_id", "user_id", "user__username", "value"
+        ):
+            splits[recurring_id].append((user_id, username, value))
+
+        # Occurrences that already exist are skipped so a run that died after
+        # committing some work can never double-book a period. Deleted ones
+        # count too, deleting an occurrence mustn't bring it back.
+        existing = set(
+            Expense.all_objects.filter(
+                recurring__in=batch, period__gte=min(r.next_run for r in batch)
+            ).values_list("recurring_id", "period")
+        )
+
+        expenses = []
+        for recurring in batch:
+            while recurring.next_run <= today:
+                if (recurring.id, recurring.next_run) not in existing:
+                    expenses.append(
+                        Expense(
+                            owner_id=recurring.owner_id,
+                            title=recurring.title,
+                            amount=recurring.amount,
+                            currency=recurring.currency,
+                            split_type=recurring.split_type,
+                            recurring=recurring,
+                            period=recurring.next_run,
+                        )
+                    )
+                recurring.next_run = recurring.following(recurring.next_run)
+
+        Expense.objects.bulk_create(expenses)
+        # `created` is set to now on insert; occurrences of past periods are
+        # dated to their period so that spending rollups count them there.
+        backfilled = [expense for expense in expenses if expense.period < today]
+        for expense in backfilled:
+            expense.created = timezone.make_aware(
+                datetime.combine(expense.period, datetime.min.time())
+            )
+        Expense.objects.bulk_update(backfilled, ["created"])
+        ExpenseSplit.objects.bulk_create(
+            ExpenseSplit(expense=expense, user_id=user_id, value=value)
+            for expense in expenses
+            for user_id, _, value in splits[expense.recurring_id]
+        )
+        RecurringExpense.objects.bulk_update(batch, ["next_run"])
+        record_expenses([expense.id for expense in expenses])
+
+        audit_on_commit(
+            [
+                AuditEntry(
+                    expense_id=expense.id,
+                    action=AuditEntry.CREATED,
+                    changes=diff(
+                        {},
+                        snapshot(
+                            expense,
+                            [
+                                (username, value)
+                                for _, username, value in splits[expense.recurring_id]
+                            ],
+                        ),
+                    ),
+                )
+                for expense in expenses
+            ]
+        )
+
+        touched = set()
+        for expense in expenses:
+            participant_ids = [
+                user_id for user_id, _, _ in splits[expense.recurring_id]
+            ]
+            publish_on_commit(EXPENSE_CREATED, expense.id, participant_ids)
+            touched.update(participant_ids)
+        invalidate_on_commit(touched)
+
+        return len(expenses)
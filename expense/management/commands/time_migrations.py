@@ -0,0 +1,164 @@
+import re
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.exceptions import AmbiguityError
+from django.db.migrations.executor import MigrationExecutor
+
+# Statements that block writers to the table they touch until they finish, or
+# until the migration commits when the database runs DDL in transactions.
+LOCKING = re.compile(
+    r"^\s*(ALTER|DROP|TRUNCATE|INSERT|UPDATE|DELETE|CREATE(?!\s+INDEX\s+CONCURRENTLY))",
+    re.IGNORECASE,
+)
+# Statements that copy every row of a table: SQLite rebuilds tables through
+# "new__<table>" and rewrites them to drop a column, Postgres rewrites them to
+# change a column type.
+REWRITE = {
+    "sqlite": re.compile(
+        r'^\s*INSERT\s+INTO\s+"new__|^\s*ALTER\s+TABLE\s.*\sDROP\s+COLUMN\s',
+        re.IGNORECASE | re.DOTALL,
+    ),
+    "postgresql": re.compile(
+        r"^\s*ALTER\s+TABLE\s.*\sTYPE\s", re.IGNORECASE | re.DOTALL
+    ),
+}
+INDEX = re.compile(r"^\s*CREATE\s+(UNIQUE\s+)?INDEX", re.IGNORECASE)
+
+
+class Timing:
+    """Statements run by one migration, with their start and end times."""
+
+    def __init__(self, migration, backwards):
+        self.migration = migration
+        self.backwards = backwards
+        self.statements = []
+        self.start = time.perf_counter()
+        self.end = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            # the django_migrations bookkeeping isn't part of the schema change
+            if "django_migrations" not in sql:
+                self.statements.append((sql, start, time.perf_counter()))
+
+    @property
+    def total(self):
+        return self.end - self.start
+
+    def duration(self, pattern):
+        return sum(
+            end - start for sql, start, end in self.statements if pattern.match(sql)
+        )
+
+    def lock(self, transactional):
+        """
+        How long writers were blocked. Inside a transaction the locks taken by
+        the first locking statement are held until commit, otherwise each
+        statement only blocks for as long as it runs.
+        """
+        starts = [start for sql, start, _ in self.statements if LOCKING.match(sql)]
+        if not starts:
+            return 0
+        if transactional:
+            return self.end - starts[0]
+        return self.duration(LOCKING)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run migrations like `migrate` does, reporting for each one how long it "
+        "took, how long it blocked writes and how long it spent rewriting "
+        "tables and building indexes. Load realistic data first, e.g. with "
+        "`generate_fixtures`, and run against a copy of the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("app_label", nargs="?")
+        parser.add_argument("migration_name", nargs="?")
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            "--slowest",
+            type=int,
+            default=3,
+            help="Show this many of the slowest statements of each migration",
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        self.timings = []
+        self.current = None
+        executor = MigrationExecutor(connection, self.progress)
+        executor.loader.check_consistent_history(connection)
+
+        targets = self.targets(
+            executor, options["app_label"], options["migration_name"]
+        )
+        plan = executor.migration_plan(targets)
+        if not plan:
+            self.stdout.write("No migrations to apply.")
+            return
+
+        with connection.execute_wrapper(self.record):
+            state = executor.migrate(targets, plan=plan)
+        state.clear_delayed_apps_cache()
+        emit_post_migrate_signal(0, False, connection.alias, apps=state.apps, plan=plan)
+
+        transactional = connection.features.can_rollback_ddl
+        rewrite = REWRITE.get(connection.vendor, re.compile("(?!)"))
+        for timing in self.timings:
+            migration = timing.migration
+            self.stdout.write(
+                f"{'Unapplied' if timing.backwards else 'Applied'} "
+                f"{migration.app_label}.{migration.name}: "
+                f"total {timing.total:.3f}s, "
+                f"writes blocked {timing.lock(transactional and migration.atomic):.3f}s, "
+                f"rewrite {timing.duration(rewrite):.3f}s, "
+                f"index build {timing.duration(INDEX):.3f}s, "
+                f"{len(timing.statements)} statements"
+            )
+            slowest = sorted(
+                timing.statements,
+                key=lambda statement: statement[2] - statement[1],
+                reverse=True,
+            )
+            for sql, start, end in slowest[: options["slowest"]]:
+                self.stdout.write(
+                    f"  {end - start:8.3f}s  {' '.join(sql.split())[:100]}"
+                )
+
+    def targets(self, executor, app_label, migration_name):
+        graph = executor.loader.graph
+        if app_label is None:
+            return graph.leaf_nodes()
+        if app_label not in executor.loader.migrated_apps:
+            raise CommandError(f"App '{app_label}' does not have migrations.")
+        if migration_name is None:
+            return [key for key in graph.leaf_nodes() if key[0] == app_label]
+        if migration_name == "zero":
+            return [(app_label, None)]
+        try:
+            migration = executor.loader.get_migration_by_prefix(
+                app_label, migration_name
+            )
+        except (KeyError, AmbiguityError) as e:
+            raise CommandError(str(e))
+        return [(app_label, migration.name)]
+
+    def progress(self, action, migration=None, fake=False):
+        if action in ("apply_start", "unapply_start"):
+            self.current = Timing(migration, action == "unapply_start")
+        elif action in ("apply_success", "unapply_success"):
+            self.current.end = time.perf_counter()
+            self.timings.append(self.current)
+            self.current = None
+
+    def record(self, execute, sql, params, many, context):
+        if self.current is None:
+            return execute(sql, params, many, context)
+        return self.current(execute, sql, params, many, context)
@@ -0,0 +1,67 @@
+# Generated by Django 5.0.7 on 2026-10-19 11:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expense', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringExpenseSplit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.DecimalField(decimal_places=2, max_digits=10)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='period',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='RecurringExpense',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=255)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('split_type', models.CharField(choices=[('EXACT', 'Specify Amount'), ('EQUAL', 'Divide Equally'), ('PERCENTAGE', 'Divide based on Percentage')], max_length=20)),
+                ('rule', models.CharField(choices=[('DAILY', 'Every Day'), ('WEEKLY', 'Every Week'), ('MONTHLY', 'Every Month'), ('YEARLY', 'Every Year')], max_length=20)),
+                ('start_date', models.DateField()),
+                ('next_run', models.DateField()),
+                ('is_active', models.BooleanField(default=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='recurring',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='expense.recurringexpense'),
+        ),
+        migrations.AddConstraint(
+            model_name='expense',
+            constraint=models.UniqueConstraint(fields=('recurring', 'period'), name='unique_recurring_period'),
+        ),
+        migrations.AddField(
+            model_name='recurringexpensesplit',
+            name='recurring',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='expense.recurringexpense'),
+        ),
+        migrations.AddField(
+            model_name='recurringexpensesplit',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='recurringexpense',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['next_run'], name='recurring_due_idx'),
+        ),
+    ]
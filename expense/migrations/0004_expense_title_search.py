@@ -0,0 +1,14 @@
+from django.db import migrations
+
+from expense.search import install_title_index, uninstall_title_index
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("expense", "0003_currency"),
+    ]
+
+    operations = [
+        migrations.RunPython(install_title_index, uninstall_title_index),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.0.7 on 2026-10-19 11:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("expense", "0004_expense_title_search"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SpendRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("currency", models.CharField(max_length=3)),
+                (
+                    "own",
+                    models.DecimalField(decimal_places=4, default=0, max_digits=16),
+                ),
+                (
+                    "shared",
+                    models.DecimalField(decimal_places=4, default=0, max_digits=16),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="spendrollup",
+            constraint=models.UniqueConstraint(
+                fields=("user", "day", "currency"), name="unique_spend_rollup"
+            ),
+        ),
+    ]
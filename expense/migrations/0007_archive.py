@@ -0,0 +1,47 @@
+# Generated by Django 5.0.7 on 2026-10-19 11:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expense', '0006_idempotency_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ArchivedExpense',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=255)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('currency', models.CharField(max_length=3)),
+                ('split_type', models.CharField(choices=[('EXACT', 'Specify Amount'), ('EQUAL', 'Divide Equally'), ('PERCENTAGE', 'Divide based on Percentage')], max_length=20)),
+                ('created', models.DateTimeField()),
+                ('updated', models.DateTimeField()),
+                ('recurring_id', models.BigIntegerField(blank=True, null=True)),
+                ('period', models.DateField(blank=True, null=True)),
+                ('deleted_at', models.DateTimeField(blank=True, null=True)),
+                ('archived', models.DateTimeField(auto_now_add=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedExpenseSplit',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('value', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('expense', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='expensesplit_set', related_query_name='expensesplit', to='expense.archivedexpense')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
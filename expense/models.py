@@ -1,20 +1,30 @@
+import calendar
+from datetime import timedelta
+
 from django.db import models
 from django.core.exceptions import ObjectDoesNotExist
 from django.http import Http404
+from django.utils import timezone
 
 from user.models import User
 
 
 class ExpenseManager(models.Manager):
+    """Expenses that haven't been deleted; `Expense.all_objects` has them all."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
     def get_object_by_id(self, id):
         try:
             instance = self.get(id=id)
             return instance
         except (ObjectDoesNotExist, ValueError, TypeError):
-            return Http404
+            raise Http404
 
 
 class Expense(models.Model):
+    DEFAULT_CURRENCY = "INR"
     EXACT = "EXACT"
     PERCENTAGE = "PERCENTAGE"
     EQUAL = "EQUAL"
@@ -26,14 +36,32 @@ class Expense(models.Model):
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
     title = models.CharField(max_length=255)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
+    # ISO 4217 code of `amount` and of the split values
+    currency = models.CharField(max_length=3, default=DEFAULT_CURRENCY)
     split_type = models.CharField(max_length=20, choices=SPLIT_TYPE)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
+    # set on expenses materialized from a RecurringExpense
+    recurring = models.ForeignKey(
+        "RecurringExpense", null=True, blank=True, on_delete=models.SET_NULL
+    )
+    period = models.DateField(null=True, blank=True)
+    # tombstone: deleted expenses keep their row and splits until archived
+    deleted_at = models.DateTimeField(null=True, blank=True)
 
     objects = ExpenseManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        constraints = [
+            # one occurrence per template and period, whoever materializes it
+            models.UniqueConstraint(
+                fields=["recurring", "period"], name="unique_recurring_period"
+            ),
+        ]
 
     def __str__(self) -> str:
-        return f"{self.title[:15]} {self.amount} INR"
+        return f"{self.title[:15]} {self.amount} {self.currency}"
 
 
 class ExpenseSplit(models.Model):
@@ -43,3 +71,256 @@ class ExpenseSplit(models.Model):
 
     def __str__(self) -> str:
         return f"{self.user} {self.value}"
+
+    @staticmethod
+    def spent_expression():
+        """
+        What a split costs its user in the expense currency, as a query
+        expression: PERCENTAGE splits hold a share of the amount, the other
+        split types hold the amount itself.
+        """
+        return models.Case(
+            models.When(
+                expense__split_type=Expense.PERCENTAGE,
+                then=models.F("value") * models.F("expense__amount") / 100,
+            ),
+            default=models.F("value"),
+            output_field=models.DecimalField(max_digits=20, decimal_places=4),
+        )
+
+
+def add_months(day, months, anchor_day):
+    """
+    Move `day` by whole months, keeping the day of month at `anchor_day`
+    where the target month is long enough (31st -> 28th/29th -> 31st).
+    """
+    month = day.month - 1 + months
+    year = day.year + month // 12
+    month = month % 12 + 1
+    return day.replace(
+        year=year, month=month, day=min(anchor_day, calendar.monthrange(year, month)[1])
+    )
+
+
+class RecurringExpense(models.Model):
+    DAILY = "DAILY"
+    WEEKLY = "WEEKLY"
+    MONTHLY = "MONTHLY"
+    YEARLY = "YEARLY"
+    RULE = (
+        (DAILY, "Every Day"),
+        (WEEKLY, "Every Week"),
+        (MONTHLY, "Every Month"),
+        (YEARLY, "Every Year"),
+    )
+    owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    title = models.CharField(max_length=255)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    currency = models.CharField(max_length=3, default=Expense.DEFAULT_CURRENCY)
+    split_type = models.CharField(max_length=20, choices=Expense.SPLIT_TYPE)
+    rule = models.CharField(max_length=20, choices=RULE)
+    start_date = models.DateField()
+    # date of the next occurrence that has not been materialized yet
+    next_run = models.DateField()
+    is_active = models.BooleanField(default=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # the scheduler only ever reads active templates that are due
+            models.Index(
+                fields=["next_run"],
+                condition=models.Q(is_active=True),
+                name="recurring_due_idx",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.title[:15]} {self.amount} {self.currency} {self.rule}"
+
+    def following(self, day):
+        """Date of the occurrence after the one on `day`."""
+        if self.rule == self.DAILY:
+            return day + timedelta(days=1)
+        if self.rule == self.WEEKLY:
+            return day + timedelta(weeks=1)
+        if self.rule == self.MONTHLY:
+            return add_months(day, 1, self.start_date.day)
+        return add_months(day, 12, self.start_date.day)
+
+
+class RecurringExpenseSplit(models.Model):
+    recurring = models.ForeignKey(RecurringExpense, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    value = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def __str__(self) -> str:
+        return f"{self.user} {self.value}"
+
+
+class FxRate(models.Model):
+    """
+    Value of one unit of `currency` in settings.FX_BASE_CURRENCY, as published
+    on `as_of`. Loaded from a file with `manage.py load_fx_rates`.
+    """
+
+    currency = models.CharField(max_length=3)
+    as_of = models.DateField()
+    rate = models.DecimalField(max_digits=20, decimal_places=10)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["currency", "as_of"], name="unique_fx_rate_per_day"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.currency} {self.rate} ({self.as_of})"
+
+
+class SpendRollup(models.Model):
+    """
+    What a user spent per day and currency, split into expenses they own and
+    expenses shared with them. Maintained from the expense write paths and
+    rebuilt from scratch by `manage.py rebuild_spend_rollups`.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    day = models.DateField()
+    currency = models.CharField(max_length=3)
+    own = models.DecimalField(max_digits=16, decimal_places=4, default=0)
+    shared = models.DecimalField(max_digits=16, decimal_places=4, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "day", "currency"], name="unique_spend_rollup"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.user} {self.day} {self.own + self.shared} {self.currency}"
+
+
+class ArchivedExpense(models.Model):
+    """
+    An expense moved out of the hot tables by `manage.py archive_expenses`,
+    under its original id. Splits are reachable under the same names as on
+    Expense (`expensesplit_set`, `expensesplit__...` lookups), so filters and
+    aggregates written for expenses work here unchanged.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    title = models.CharField(max_length=255)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    currency = models.CharField(max_length=3)
+    split_type = models.CharField(max_length=20, choices=Expense.SPLIT_TYPE)
+    created = models.DateTimeField()
+    updated = models.DateTimeField()
+    recurring_id = models.BigIntegerField(null=True, blank=True)
+    period = models.DateField(null=True, blank=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    archived = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f"{self.title[:15]} {self.amount} {self.currency}"
+
+
+class ArchivedExpenseSplit(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    expense = models.ForeignKey(
+        ArchivedExpense,
+        on_delete=models.CASCADE,
+        related_name="expensesplit_set",
+        related_query_name="expensesplit",
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    value = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def __str__(self) -> str:
+        return f"{self.user} {self.value}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Outcome of a request sent with an `Idempotency-Key` header. The unique
+    constraint decides which of several concurrent duplicates gets to run;
+    `status_code` stays empty until that one has finished.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True)
+    created = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "key"], name="unique_idempotency_key"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.user} {self.key}"
+
+
+class AuditEntry(models.Model):
+    """
+    One change to an expense, appended by the write paths through
+    `expense.audit` and never updated. `expense_id` isn't a foreign key so the
+    history outlives the expense, archived or not.
+    """
+
+    CREATED = "created"
+    UPDATED = "updated"
+    DELETED = "deleted"
+    ACTION = (
+        (CREATED, "Created"),
+        (UPDATED, "Updated"),
+        (DELETED, "Deleted"),
+    )
+    expense_id = models.BigIntegerField()
+    # None for changes made by the system, e.g. recurring expenses. No database
+    # constraint: an actor deleted while their entries wait for the writer
+    # mustn't make the whole batch fail.
+    actor = models.ForeignKey(
+        User, null=True, on_delete=models.SET_NULL, db_constraint=False
+    )
+    action = models.CharField(max_length=10, choices=ACTION)
+    # {field: [old, new]}, `participants` holding the whole list of splits
+    changes = models.JSONField()
+    created = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["expense_id", "-id"], name="audit_expense_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.expense_id} {self.action} by {self.actor}"
+
+
+class Receipt(models.Model):
+    """
+    A receipt attached to an expense. The file lives in `expense.receipts`
+    storage under `sha256`, shared by every receipt with the same content.
+    Like AuditEntry, `expense_id` isn't a foreign key so receipts stay with
+    archived expenses.
+    """
+
+    expense_id = models.BigIntegerField(db_index=True)
+    sha256 = models.CharField(max_length=64, db_index=True)
+    name = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=50)
+    size = models.PositiveIntegerField()
+    uploaded_by = models.ForeignKey(User, null=True, on_delete=models.SET_NULL)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f"{self.expense_id} {self.name}"
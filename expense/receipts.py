@@ -0,0 +1,224 @@
+"""
+Receipt files on local disk.
+
+Files are stored under the SHA-256 of their content, so a receipt uploaded
+twice, by anyone, is stored once:
+
+    RECEIPTS_ROOT/ab/cd/abcd...          the original
+    RECEIPTS_ROOT/ab/cd/abcd....thumb.jpg  one file per RECEIPT_VARIANTS entry
+
+Uploads are hashed while they are streamed into RECEIPTS_ROOT/tmp and then
+renamed into place. Variants are made by a thread pool once the receipt is
+committed; Pillow releases the GIL while decoding and resizing.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.db import transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+    "WEBP": "image/webp",
+    "GIF": "image/gif",
+}
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class InvalidReceipt(Exception):
+    pass
+
+
+def root():
+    return Path(settings.RECEIPTS_ROOT)
+
+
+def original_path(sha256):
+    return root() / sha256[:2] / sha256[2:4] / sha256
+
+
+def variant_path(sha256, variant):
+    return original_path(sha256).with_name(f"{sha256}.{variant}.jpg")
+
+
+class HashedUploadedFile(UploadedFile):
+    """An upload already on disk at `path`, with the SHA-256 of its content."""
+
+    def __init__(self, path, name, content_type, size, charset, sha256):
+        super().__init__(None, name, content_type, size, charset)
+        self.path = path
+        self.sha256 = sha256
+
+    def discard(self):
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class ReceiptUploadHandler(FileUploadHandler):
+    """
+    Writes each uploaded file straight to a temporary file next to its final
+    location, hashing it on the way, so no upload is held in memory whatever
+    its size. Files over RECEIPT_MAX_BYTES are dropped and `too_large` set.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.too_large = False
+        self.file = None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        tmp = root() / "tmp"
+        tmp.mkdir(parents=True, exist_ok=True)
+        self.file = tempfile.NamedTemporaryFile(dir=tmp, delete=False)
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > settings.RECEIPT_MAX_BYTES:
+            self.too_large = True
+            self.upload_interrupted()
+            raise SkipFile
+        self.hash.update(raw_data)
+        self.file.write(raw_data)
+        # consumed here, no other handler gets the data
+        return None
+
+    def file_complete(self, file_size):
+        self.file.close()
+        upload = HashedUploadedFile(
+            self.file.name,
+            self.file_name,
+            self.content_type,
+            self.size,
+            self.charset,
+            self.hash.hexdigest(),
+        )
+        self.file = None
+        return upload
+
+    def upload_interrupted(self):
+        if self.file is not None:
+            self.file.close()
+            os.unlink(self.file.name)
+            self.file = None
+
+
+def store(upload):
+    """
+    Check that the upload is an image and move it to its content-addressed
+    path, dropping it if the same content is already stored. Returns the
+    content type. Raises InvalidReceipt for anything but a supported image.
+    """
+    try:
+        with Image.open(upload.path) as image:
+            image.verify()
+            content_type = CONTENT_TYPES.get(image.format)
+    except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError):
+        content_type = None
+    if content_type is None:
+        upload.discard()
+        raise InvalidReceipt("Receipts must be JPEG, PNG, WEBP or GIF images.")
+
+    path = original_path(upload.sha256)
+    try:
+        # touched so purge_receipt_files, which only deletes files older than
+        # --min-age, leaves it to the receipt about to refer to it
+        os.utime(path)
+    except FileNotFoundError:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(upload.path, path)
+    else:
+        upload.discard()
+    return content_type
+
+
+def make_variants(sha256):
+    """Write the missing variants of a stored receipt."""
+    missing = {
+        variant: size
+        for variant, size in settings.RECEIPT_VARIANTS.items()
+        if not variant_path(sha256, variant).exists()
+    }
+    if not missing:
+        return
+    with Image.open(original_path(sha256)) as image:
+        # JPEGs can be decoded straight at a fraction of their size
+        image.draft("RGB", (max(missing.values()),) * 2)
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        for variant, size in sorted(missing.items(), key=lambda item: -item[1]):
+            image.thumbnail((size, size))
+            path = variant_path(sha256, variant)
+            # written aside and renamed so readers never see half a file
+            with tempfile.NamedTemporaryFile(
+                dir=path.parent, suffix=".jpg", delete=False
+            ) as tmp:
+                image.save(tmp, "JPEG", quality=80, optimize=True)
+            os.replace(tmp.name, path)
+
+
+def _make_variants_logged(sha256):
+    try:
+        make_variants(sha256)
+    except Exception:
+        logger.exception("Could not make variants of receipt %s", sha256)
+
+
+@lru_cache(maxsize=None)
+def get_pool():
+    return ThreadPoolExecutor(
+        max_workers=settings.RECEIPT_WORKERS, thread_name_prefix="receipt"
+    )
+
+
+def make_variants_on_commit(sha256):
+    transaction.on_commit(lambda: get_pool().submit(_make_variants_logged, sha256))
+
+
+def parse_range(header, size):
+    """
+    The (start, end) byte positions, inclusive, asked for by a single range
+    `Range` header. None when the whole file should be sent. Raises
+    ValueError for ranges that can't be satisfied.
+    """
+    match = RANGE.match(header or "")
+    if match is None or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first == "":
+        # suffix range: the last N bytes
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        raise ValueError(header)
+    return start, end
+
+
+def read_range(path, start, end, chunk_size=64 * 1024):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
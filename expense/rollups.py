@@ -0,0 +1,56 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import TruncDate
+
+from .models import ExpenseSplit, SpendRollup
+
+
+def spend_by_day(splits):
+    """
+    Group splits into one (user_id, day, currency, own, shared) row per user,
+    day and currency, in a single aggregate query.
+    """
+    spent = ExpenseSplit.spent_expression()
+    own = Q(expense__owner_id=F("user_id"))
+    rows = (
+        splits.values("user_id", "expense__currency", day=TruncDate("expense__created"))
+        .annotate(
+            own=Sum(spent, filter=own, default=0),
+            shared=Sum(spent, filter=~own, default=0),
+        )
+        .order_by()
+    )
+    for row in rows.iterator(chunk_size=2000):
+        yield (
+            row["user_id"],
+            row["day"],
+            row["expense__currency"],
+            row["own"],
+            row["shared"],
+        )
+
+
+def record_expenses(expense_ids, sign=1):
+    """
+    Add (sign=1) or remove (sign=-1) the current splits of the given expenses
+    from the rollups. Must run inside the transaction that writes them:
+    removing before the expense or its splits change, adding afterwards.
+    """
+    for user_id, day, currency, own, shared in spend_by_day(
+        ExpenseSplit.objects.filter(expense_id__in=expense_ids)
+    ):
+        _increment(user_id, day, currency, sign * own, sign * shared)
+
+
+def _increment(user_id, day, currency, own, shared):
+    rollup = SpendRollup.objects.filter(user_id=user_id, day=day, currency=currency)
+    if rollup.update(own=F("own") + own, shared=F("shared") + shared):
+        return
+    try:
+        with transaction.atomic():
+            SpendRollup.objects.create(
+                user_id=user_id, day=day, currency=currency, own=own, shared=shared
+            )
+    except IntegrityError:
+        # created by a concurrent writer since the update above
+        rollup.update(own=F("own") + own, shared=F("shared") + shared)
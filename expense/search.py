@@ -0,0 +1,117 @@
+import re
+
+from django.db import connections
+from django.db.models import F, Lookup
+from django.db.models.expressions import RawSQL
+
+# SQLite keeps an external-content FTS5 index of expense titles, synced by
+# triggers. Migrations that make Django rebuild the expense table on SQLite
+# drop its triggers, so they must run `install_title_index` again.
+SQLITE_FTS_TABLE = "expense_expense_fts"
+
+SQLITE_INSTALL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE}
+    USING fts5(title, content='expense_expense', content_rowid='id')
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_ai
+    AFTER INSERT ON expense_expense BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, title) VALUES (new.id, new.title);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_ad
+    AFTER DELETE ON expense_expense BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, title)
+        VALUES ('delete', old.id, old.title);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_au
+    AFTER UPDATE OF title ON expense_expense BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, title)
+        VALUES ('delete', old.id, old.title);
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, title) VALUES (new.id, new.title);
+    END
+    """,
+    f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_UNINSTALL = [
+    f"DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}",
+]
+
+# On Postgres a trigram GIN index serves `title ILIKE '%...%'` and is kept in
+# sync by the database itself. Django's icontains compiles to
+# `UPPER(title) LIKE UPPER(...)` there, which this index can't serve, so
+# search_titles emits the ILIKE itself.
+POSTGRES_INSTALL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE INDEX IF NOT EXISTS expense_title_trgm_idx
+    ON expense_expense USING gin (title gin_trgm_ops)
+    """,
+]
+
+POSTGRES_UNINSTALL = ["DROP INDEX IF EXISTS expense_title_trgm_idx"]
+
+
+def install_title_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {"sqlite": SQLITE_INSTALL, "postgresql": POSTGRES_INSTALL}
+    for statement in statements.get(vendor, []):
+        schema_editor.execute(statement)
+
+
+def uninstall_title_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {"sqlite": SQLITE_UNINSTALL, "postgresql": POSTGRES_UNINSTALL}
+    for statement in statements.get(vendor, []):
+        schema_editor.execute(statement)
+
+
+def fts_query(text):
+    """
+    Turn free text into an FTS5 query matching every word as a prefix, with
+    each word quoted so user input can't use FTS5 query syntax.
+    """
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", text))
+
+
+class ILike(Lookup):
+    lookup_name = "ilike"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} ILIKE {rhs}", lhs_params + rhs_params
+
+
+def search_titles(queryset, text):
+    """
+    Expenses whose title matches `text`. The match differs by database:
+    SQLite's FTS5 index matches every word as a word prefix, in any order
+    ("din piz" finds "Pizza dinner"), elsewhere the whole text is matched as a
+    case-insensitive substring ("inner" finds "Dinner").
+    """
+    vendor = connections[queryset.db].vendor
+    if vendor == "sqlite":
+        query = fts_query(text)
+        if not query:
+            return queryset
+        return queryset.filter(
+            id__in=RawSQL(
+                f"SELECT rowid FROM {SQLITE_FTS_TABLE} "
+                f"WHERE {SQLITE_FTS_TABLE} MATCH %s",
+                [query],
+            )
+        )
+    if vendor == "postgresql":
+        connection = connections[queryset.db]
+        pattern = f"%{connection.ops.prep_for_like_query(text)}%"
+        return queryset.filter(ILike(F("title"), pattern))
+    return queryset.filter(title__icontains=text)
@@ -1,10 +1,43 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
 from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
 
-from .models import Expense, ExpenseSplit
+from .audit import audit_on_commit, diff, snapshot
+from .cache import invalidate_on_commit
+from .events import EXPENSE_CREATED, EXPENSE_UPDATED, publish_on_commit
+from .fx import get_rate_table
+from .models import (
+    AuditEntry,
+    Expense,
+    ExpenseSplit,
+    Receipt,
+    RecurringExpense,
+    RecurringExpenseSplit,
+)
+from .receipts import variant_path
+from .rollups import record_expenses
 from user.models import User
 
 
+def validate_currency_code(value):
+    """
+    The upper-cased ISO 4217 code, refused unless balances in it can be
+    converted, i.e. it is FX_BASE_CURRENCY or has a loaded FX rate.
+    """
+    value = value.upper()
+    if len(value) != 3 or not value.isalpha():
+        raise serializers.ValidationError(
+            "Currency must be a three letter ISO 4217 code."
+        )
+    if not get_rate_table().knows(value):
+        raise serializers.ValidationError(f"There is no exchange rate for {value}.")
+    return value
+
+
 class ExpenseSplitSerializer(serializers.ModelSerializer):
     user = serializers.CharField()  # this will help to collect username
 
@@ -13,6 +46,30 @@ class ExpenseSplitSerializer(serializers.ModelSerializer):
         fields = ["user", "value"]
 
 
+class AuditEntrySerializer(serializers.ModelSerializer):
+    actor = serializers.CharField(source="actor.username", default=None)
+
+    class Meta:
+        model = AuditEntry
+        fields = ["id", "action", "actor", "changes", "created"]
+
+
+class ReceiptSerializer(serializers.ModelSerializer):
+    variants = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Receipt
+        fields = ["id", "name", "content_type", "size", "created", "variants"]
+
+    def get_variants(self, obj):
+        """Variants made so far, fetched with `?variant=<name>`."""
+        return [
+            variant
+            for variant in settings.RECEIPT_VARIANTS
+            if variant_path(obj.sha256, variant).exists()
+        ]
+
+
 class ExpenseSerializer(serializers.ModelSerializer):
     participants = serializers.SerializerMethodField()
     created = serializers.DateTimeField(read_only=True)
@@ -25,6 +82,7 @@ class ExpenseSerializer(serializers.ModelSerializer):
             # "owner",
             "title",
             "amount",
+            "currency",
             "split_type",
             "created",
             "updated",
@@ -36,7 +94,11 @@ class ExpenseSerializer(serializers.ModelSerializer):
         splits = obj.expensesplit_set.all()
         return ExpenseSplitSerializer(splits, many=True).data
 
-    def create(self, validated_data):
+    def get_participant_users(self):
+        """
+        Resolve the posted participants into a list of (user, value) tuples,
+        checking that users are unique, exist, and include the request user.
+        """
         participants_data = self.initial_data.get("participants", [])
 
         # collecting unique user's username
@@ -56,7 +118,7 @@ class ExpenseSerializer(serializers.ModelSerializer):
 
         # this is list of tuple containing (user, value)
         user_list = []
-        # Convert usernames to user instances and create ExpenseSplit objects
+        # Convert usernames to user instances and also checking if user exist or not.
         for participant_data in participants_data:
             username = participant_data.pop("user")
             user = User.objects.filter(username=username).first()
@@ -67,6 +129,11 @@ class ExpenseSerializer(serializers.ModelSerializer):
 
             user_list.append((user, participant_data.pop("value")))
 
+        return user_list
+
+    def create(self, validated_data):
+        user_list = self.get_participant_users()
+
         # After all validation we save the data
         # Atomic transaction block
         with transaction.atomic():
@@ -75,6 +142,7 @@ class ExpenseSerializer(serializers.ModelSerializer):
                 owner=self.context["request"].user,
                 title=validated_data["title"],
                 amount=validated_data["amount"],
+                currency=validated_data.get("currency", Expense.DEFAULT_CURRENCY),
                 split_type=validated_data["split_type"],
             )
 
@@ -82,47 +150,58 @@ class ExpenseSerializer(serializers.ModelSerializer):
             for user, value in user_list:
                 ExpenseSplit.objects.create(expense=expense, user=user, value=value)
 
+            record_expenses([expense.id])
+
+            audit_on_commit(
+                [
+                    AuditEntry(
+                        expense_id=expense.id,
+                        actor=self.context["request"].user,
+                        action=AuditEntry.CREATED,
+                        changes=diff(
+                            {},
+                            snapshot(
+                                expense,
+                                [(user.username, value) for user, value in user_list],
+                            ),
+                        ),
+                    )
+                ]
+            )
+
+            participant_ids = [user.id for user, _ in user_list]
+            publish_on_commit(EXPENSE_CREATED, expense.id, participant_ids)
+            invalidate_on_commit(participant_ids)
+
         return expense
 
     def update(self, instance, validated_data):
-        participants_data = self.initial_data.get("participants", [])
+        user_list = self.get_participant_users()
 
-        # Collect unique user's username
-        participants_set = set(data["user"] for data in participants_data)
+        # Atomic transaction block
+        with transaction.atomic():
+            # Take the old amounts out of the spend rollups before they change
+            record_expenses([instance.id], sign=-1)
 
-        # Validate all users must be unique
-        if len(participants_data) != len(participants_set):
-            raise serializers.ValidationError(
-                "Duplicate user found in Participants instances, User must be unique."
+            old_splits = list(
+                ExpenseSplit.objects.filter(expense=instance).values_list(
+                    "user_id", "user__username", "value"
+                )
             )
-
-        # Checking user must be in participants too.
-        if self.context["request"].user.username not in participants_set:
-            raise serializers.ValidationError(
-                "Owner of the Expense must be in Participants."
+            old_state = snapshot(
+                instance, [(username, value) for _, username, value in old_splits]
             )
 
-        # this is list of tuple containing (user, value)
-        user_list = []
-        # Convert usernames to user instances and and also checking if user exist or not.
-        for participant_data in participants_data:
-            username = participant_data.pop("user")
-            user = User.objects.filter(username=username).first()
-
-            if user is None:
-                raise serializers.ValidationError(
-                    f"User with username {username} does not exist."
-                )
-            user_list.append((user, participant_data.pop("value")))
-
-        # Atomic transaction block
-        with transaction.atomic():
             # Update the expense instance
             instance.title = validated_data.get("title", instance.title)
             instance.amount = validated_data.get("amount", instance.amount)
+            instance.currency = validated_data.get("currency", instance.currency)
             instance.split_type = validated_data.get("split_type", instance.split_type)
             instance.save()
 
+            # Old participants must hear about the change too, even if removed
+            old_user_ids = [user_id for user_id, _, _ in old_splits]
+
             # Delete old ExpenseSplit objects
             ExpenseSplit.objects.filter(expense=instance).delete()
 
@@ -130,8 +209,35 @@ class ExpenseSerializer(serializers.ModelSerializer):
             for user, value in user_list:
                 ExpenseSplit.objects.create(expense=instance, user=user, value=value)
 
+            record_expenses([instance.id])
+
+            changes = diff(
+                old_state,
+                snapshot(
+                    instance, [(user.username, value) for user, value in user_list]
+                ),
+            )
+            if changes:
+                audit_on_commit(
+                    [
+                        AuditEntry(
+                            expense_id=instance.id,
+                            actor=self.context["request"].user,
+                            action=AuditEntry.UPDATED,
+                            changes=changes,
+                        )
+                    ]
+                )
+
+            participant_ids = old_user_ids + [user.id for user, _ in user_list]
+            publish_on_commit(EXPENSE_UPDATED, instance.id, participant_ids)
+            invalidate_on_commit(participant_ids + [instance.owner_id])
+
         return instance
 
+    def validate_currency(self, value):
+        return validate_currency_code(value)
+
     def validate(self, data):
         """
         Here we are validating some Critical cases as defined below.
@@ -185,3 +291,136 @@ class ExpenseSerializer(serializers.ModelSerializer):
                 )
 
         return data
+
+
+class RecurringExpenseSerializer(ExpenseSerializer):
+    """
+    Template for an expense that repeats. Participants are posted and
+    validated exactly like for a one-off expense.
+    """
+
+    class Meta:
+        model = RecurringExpense
+        fields = [
+            "id",
+            "title",
+            "amount",
+            "currency",
+            "split_type",
+            "rule",
+            "start_date",
+            "next_run",
+            "is_active",
+            "created",
+            "updated",
+            "participants",
+        ]
+        read_only_fields = ["next_run"]
+
+    def get_participants(self, obj):
+        splits = obj.recurringexpensesplit_set.all()
+        return ExpenseSplitSerializer(splits, many=True).data
+
+    def create(self, validated_data):
+        user_list = self.get_participant_users()
+
+        with transaction.atomic():
+            recurring = RecurringExpense.objects.create(
+                owner=self.context["request"].user,
+                title=validated_data["title"],
+                amount=validated_data["amount"],
+                currency=validated_data.get("currency", Expense.DEFAULT_CURRENCY),
+                split_type=validated_data["split_type"],
+                rule=validated_data["rule"],
+                start_date=validated_data["start_date"],
+                next_run=validated_data["start_date"],
+                is_active=validated_data.get("is_active", True),
+            )
+            RecurringExpenseSplit.objects.bulk_create(
+                RecurringExpenseSplit(recurring=recurring, user=user, value=value)
+                for user, value in user_list
+            )
+
+        return recurring
+
+    def update(self, instance, validated_data):
+        user_list = self.get_participant_users()
+
+        with transaction.atomic():
+            # start_date is only used when creating, moving it would reschedule
+            # occurrences that may already exist
+            instance.title = validated_data.get("title", instance.title)
+            instance.amount = validated_data.get("amount", instance.amount)
+            instance.currency = validated_data.get("currency", instance.currency)
+            instance.split_type = validated_data.get("split_type", instance.split_type)
+            instance.rule = validated_data.get("rule", instance.rule)
+            instance.is_active = validated_data.get("is_active", instance.is_active)
+            instance.save()
+
+            RecurringExpenseSplit.objects.filter(recurring=instance).delete()
+            RecurringExpenseSplit.objects.bulk_create(
+                RecurringExpenseSplit(recurring=instance, user=user, value=value)
+                for user, value in user_list
+            )
+
+        return instance
+
+
+TWO_PLACES = Decimal("0.01")
+
+
+def _decimal_representation(value):
+    if not isinstance(value, Decimal):
+        # posted participant values are still ints, floats or strings
+        value = Decimal(str(value))
+    return "{:f}".format(value.quantize(TWO_PLACES))
+
+
+def _datetime_representation(value):
+    value = timezone.localtime(value).isoformat()
+    if value.endswith("+00:00"):
+        value = value[:-6] + "Z"
+    return value
+
+
+def serialize_expenses(queryset, split_model=ExpenseSplit):
+    """
+    Read-only fast path for listing expenses.
+
+    Gives the same output as `ExpenseSerializer(queryset, many=True).data` but
+    builds it straight from `.values()` rows: one query for the expenses, one
+    for all of their splits, grouped in a single pass. Archived expenses are
+    listed by passing an ArchivedExpense queryset and ArchivedExpenseSplit.
+    """
+    expenses = list(
+        queryset.values(
+            "id", "title", "amount", "currency", "split_type", "created", "updated"
+        )
+    )
+    if not expenses:
+        return []
+
+    participants = defaultdict(list)
+    splits = (
+        split_model.objects.filter(expense__in=queryset.values("id"))
+        .order_by("id")
+        .values_list("expense_id", "user__email", "value")
+    )
+    for expense_id, email, value in splits.iterator(chunk_size=2000):
+        participants[expense_id].append(
+            {"user": email, "value": _decimal_representation(value)}
+        )
+
+    return [
+        {
+            "id": expense["id"],
+            "title": expense["title"],
+            "amount": _decimal_representation(expense["amount"]),
+            "currency": expense["currency"],
+            "split_type": expense["split_type"],
+            "created": _datetime_representation(expense["created"]),
+            "updated": _datetime_representation(expense["updated"]),
+            "participants": participants.get(expense["id"], []),
+        }
+        for expense in expenses
+    ]
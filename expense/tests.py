@@ -1,3 +1,775 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, IntegrityError, connection
+from django.db.models import F, Sum
+from django.test import AsyncClient, TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from expense import receipts
+from expense.audit import get_writer
+from expense.cache import expense_list_cache
+from expense.models import (
+    Expense,
+    ExpenseSplit,
+    FxRate,
+    IdempotencyKey,
+    Receipt,
+    SpendRollup,
+)
+from expense.renderers import FastJSONRenderer
+from expense.search import SQLITE_FTS_TABLE, fts_query
+from expense.serializers import ExpenseSerializer, serialize_expenses
+from user.models import User
+
+
+@override_settings(AUDIT_LOG_WRITER="expense.audit.SyncWriter")
+class ExpenseTestCase(APITestCase):
+    def setUp(self):
+        # the writer is picked once per process
+        get_writer.cache_clear()
+        self.addCleanup(get_writer.cache_clear)
+        self.alice = User.objects.create_user(
+            "alice", "alice@example.com", "1234567890", "password-1"
+        )
+        self.bob = User.objects.create_user(
+            "bob", "bob@example.com", "1234567891", "password-1"
+        )
+        self.client.force_authenticate(self.alice)
+
+    def delete_expense(self, expense_id):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f"/api/v1/expenses/{expense_id}/")
+        self.assertEqual(response.status_code, 204, response.content)
+
+    def archive(self, expense_id):
+        Expense.all_objects.filter(id=expense_id).update(
+            updated=timezone.now() - timedelta(days=800)
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("archive_expenses", months=12, stdout=StringIO())
+
+    def expense_data(self, amount, **kwargs):
+        return {
+            "title": "Dinner",
+            "amount": amount,
+            "split_type": "EXACT",
+            "participants": [
+                {"user": "alice", "value": amount / 2},
+                {"user": "bob", "value": amount / 2},
+            ],
+            **kwargs,
+        }
+
+    def create_expense(self, amount=100, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/v1/expenses/", self.expense_data(amount, **kwargs), format="json"
+            )
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()["id"]
+
+    def update_expense(self, expense_id, amount=100, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(
+                f"/api/v1/expenses/{expense_id}/",
+                self.expense_data(amount, **kwargs),
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def titles(self, url):
+        response = self.client.get(url)
+        if response.status_code == 204:
+            return []
+        return sorted(expense["title"] for expense in response.json())
+
+
+class ExpenseListCacheTests(ExpenseTestCase):
+    def test_off_with_a_per_process_cache(self):
+        self.assertFalse(expense_list_cache.enabled)
+        self.create_expense()
+        misses = expense_list_cache.misses
+        self.client.get("/api/v1/expenses/")
+        self.client.get("/api/v1/expenses/")
+        self.assertEqual(expense_list_cache.misses, misses + 2)
+
+    def test_shared_cache_is_invalidated_by_changes(self):
+        with tempfile.TemporaryDirectory() as location:
+            backend = "django.core.cache.backends.filebased.FileBasedCache"
+            with override_settings(
+                CACHES={"default": {"BACKEND": backend, "LOCATION": location}}
+            ):
+                self.assertTrue(expense_list_cache.enabled)
+                self.create_expense()
+                first = self.client.get("/api/v1/expenses/").json()
+                hits = expense_list_cache.local_hits
+                self.assertEqual(self.client.get("/api/v1/expenses/").json(), first)
+                self.assertEqual(expense_list_cache.local_hits, hits + 1)
+
+                self.create_expense(title="Lunch")
+                self.assertEqual(len(self.client.get("/api/v1/expenses/").json()), 2)
+
+
+class IdempotencyKeyTests(ExpenseTestCase):
+    data = {
+        "title": "Dinner",
+        "amount": 100,
+        "split_type": "EXACT",
+        "participants": [
+            {"user": "alice", "value": 50},
+            {"user": "bob", "value": 50},
+        ],
+    }
+
+    def post(self, data, key="dinner-1"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                "/api/v1/expenses/",
+                data,
+                format="json",
+                headers={"Idempotency-Key": key},
+            )
+
+    def test_repeat_is_replayed(self):
+        first = self.post(self.data)
+        self.assertEqual(first.status_code, 201, first.content)
+        again = self.post(self.data)
+        self.assertEqual(again.status_code, 201)
+        self.assertEqual(again["Idempotent-Replayed"], "true")
+        self.assertEqual(again.json(), first.json())
+        self.assertEqual(Expense.objects.count(), 1)
+
+        self.assertEqual(self.post(self.data, key="dinner-2").status_code, 201)
+        self.assertEqual(Expense.objects.count(), 2)
+
+    def test_repeat_while_in_progress_conflicts(self):
+        self.post(self.data)
+        # as left by a request that hasn't answered yet
+        IdempotencyKey.objects.update(status_code=None, response=None)
+        self.assertEqual(self.post(self.data).status_code, 409)
+
+        IdempotencyKey.objects.update(created=timezone.now() - timedelta(days=1))
+        self.assertEqual(self.post(self.data).status_code, 201)
+        self.assertEqual(Expense.objects.count(), 2)
+
+    def test_key_let_go_while_claiming_is_claimed_again(self):
+        create = IdempotencyKey.objects.create
+        calls = []
+
+        def create_after_losing_a_race(**kwargs):
+            # the first insert collides with a request that then fails and
+            # deletes its key
+            calls.append(kwargs)
+            if len(calls) == 1:
+                raise IntegrityError
+            return create(**kwargs)
+
+        with mock.patch.object(
+            IdempotencyKey.objects, "create", create_after_losing_a_race
+        ):
+            self.assertEqual(self.post(self.data).status_code, 201)
+        self.assertEqual(len(calls), 2)
+
+    def test_expense_is_rolled_back_with_its_key(self):
+        save = IdempotencyKey.save
+
+        def fail_to_record_the_response(record, *args, update_fields=None, **kwargs):
+            if update_fields:
+                raise DatabaseError
+            save(record, *args, update_fields=update_fields, **kwargs)
+
+        with mock.patch.object(IdempotencyKey, "save", fail_to_record_the_response):
+            with self.assertRaises(DatabaseError):
+                self.post(self.data)
+        self.assertFalse(Expense.all_objects.exists())
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.post(self.data).status_code, 201)
+
+    def test_other_request_with_the_key_is_refused(self):
+        self.post(self.data)
+        response = self.post({**self.data, "amount": 200})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Expense.objects.count(), 1)
+
+
+class FastJSONTests(ExpenseTestCase):
+    def test_serialize_expenses_matches_the_serializer(self):
+        self.create_expense(title="Pizza \u2028 dinner")
+        self.create_expense(
+            30,
+            title="Lunch",
+            split_type="PERCENTAGE",
+            participants=[
+                {"user": "alice", "value": 25.5},
+                {"user": "bob", "value": 74.5},
+            ],
+        )
+        queryset = Expense.objects.order_by("-updated")
+        expected = JSONRenderer().render(
+            ExpenseSerializer(
+                queryset.prefetch_related("expensesplit_set__user"), many=True
+            ).data
+        )
+        self.assertEqual(
+            FastJSONRenderer().render(serialize_expenses(queryset)), expected
+        )
+        self.assertEqual(JSONRenderer().render(serialize_expenses(queryset)), expected)
+
+    def test_datetimes_are_rendered_like_drf(self):
+        data = {
+            "at": timezone.now(),
+            "on": date(2024, 1, 1),
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+class ExpenseSearchTests(ExpenseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.carol = User.objects.create_user(
+            "carol", "carol@example.com", "1234567892", "password-1"
+        )
+        self.dinner = self.create_expense(title="Pizza dinner")
+        self.lunch = self.create_expense(
+            30,
+            title="Lunch",
+            split_type="PERCENTAGE",
+            participants=[
+                {"user": "alice", "value": 50},
+                {"user": "carol", "value": 50},
+            ],
+        )
+        Expense.objects.filter(id=self.dinner).update(
+            created=timezone.make_aware(datetime(2024, 1, 10, 12))
+        )
+        Expense.objects.filter(id=self.lunch).update(
+            created=timezone.make_aware(datetime(2024, 3, 1, 12)), currency="EUR"
+        )
+
+    def search(self, text):
+        return self.titles(f"/api/v1/expenses/?search={text}")
+
+    def indexed(self, word):
+        """Ids the full-text index itself finds `word` in."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {SQLITE_FTS_TABLE} "
+                f"WHERE {SQLITE_FTS_TABLE} MATCH %s",
+                [fts_query(word)],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def test_search_follows_title_changes(self):
+        self.assertEqual(self.search("pizza"), ["Pizza dinner"])
+        self.assertEqual(self.search("lunch"), ["Lunch"])
+
+        self.update_expense(self.dinner, title="Team breakfast")
+        self.assertEqual(self.search("pizza"), [])
+        self.assertEqual(self.search("team"), ["Team breakfast"])
+
+        self.delete_expense(self.lunch)
+        self.assertEqual(self.search("lunch"), [])
+
+    @skipUnless(connection.vendor == "sqlite", "FTS5 index")
+    def test_index_is_kept_in_sync(self):
+        self.assertEqual(self.search("din piz"), ["Pizza dinner"])
+        self.assertEqual(self.indexed("pizza"), [self.dinner])
+
+        self.update_expense(self.dinner, title="Team breakfast")
+        self.assertEqual(self.indexed("pizza"), [])
+        self.assertEqual(self.indexed("breakfast"), [self.dinner])
+
+        self.archive(self.dinner)
+        self.assertEqual(self.indexed("breakfast"), [])
+        self.assertEqual(self.indexed("lunch"), [self.lunch])
+
+    @skipUnless(connection.vendor == "sqlite", "FTS5 index")
+    def test_triggers_survive_migrations(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' "
+                "AND tbl_name = 'expense_expense'"
+            )
+            triggers = {row[0] for row in cursor.fetchall()}
+        self.assertEqual(
+            triggers,
+            {f"{SQLITE_FTS_TABLE}_{suffix}" for suffix in ("ai", "ad", "au")},
+        )
+
+    def test_filters(self):
+        for query, titles in [
+            ("created_after=2024-02-01", ["Lunch"]),
+            ("created_before=2024-02-01", ["Pizza dinner"]),
+            ("amount_min=50", ["Pizza dinner"]),
+            ("amount_max=50", ["Lunch"]),
+            ("amount_min=30&amount_max=30", ["Lunch"]),
+            ("split_type=PERCENTAGE", ["Lunch"]),
+            ("split_type=EXACT", ["Pizza dinner"]),
+            ("currency=eur", ["Lunch"]),
+            ("counterparty=carol", ["Lunch"]),
+            ("counterparty=bob", ["Pizza dinner"]),
+            ("search=dinner&counterparty=carol", []),
+        ]:
+            with self.subTest(query=query):
+                self.assertEqual(self.titles(f"/api/v1/expenses/?{query}"), titles)
+
+    def test_invalid_filter_is_rejected(self):
+        response = self.client.get("/api/v1/expenses/?split_type=HALF")
+        self.assertEqual(response.status_code, 400)
+
+
+class ExpenseDeleteAndArchiveTests(ExpenseTestCase):
+    def test_deleted_expense_is_hidden(self):
+        expense_id = self.create_expense()
+        self.delete_expense(expense_id)
+
+        self.assertEqual(self.titles("/api/v1/expenses/"), [])
+        self.assertEqual(
+            self.client.get(f"/api/v1/expenses/{expense_id}/").status_code, 404
+        )
+        self.client.force_authenticate(self.bob)
+        self.assertEqual(self.titles("/api/v1/expenses/share"), [])
+        self.assertIsNotNone(Expense.all_objects.get(id=expense_id).deleted_at)
+        self.assertEqual(
+            SpendRollup.objects.aggregate(total=Sum(F("own") + F("shared")))["total"],
+            0,
+        )
+
+    def test_archived_expenses_are_listed_on_request(self):
+        dinner = self.create_expense()
+        self.create_expense(title="Lunch")
+        deleted = self.create_expense(title="Breakfast")
+        self.delete_expense(deleted)
+        self.archive(dinner)
+        self.archive(deleted)
+
+        self.assertFalse(Expense.all_objects.filter(id__in=[dinner, deleted]).exists())
+        self.assertEqual(self.titles("/api/v1/expenses/"), ["Lunch"])
+        self.assertEqual(
+            self.titles("/api/v1/expenses/?include_archived=true"),
+            ["Dinner", "Lunch"],
+        )
+        self.client.force_authenticate(self.bob)
+        self.assertEqual(self.titles("/api/v1/expenses/share"), ["Lunch"])
+        self.assertEqual(
+            self.titles("/api/v1/expenses/share?include_archived=true"),
+            ["Dinner", "Lunch"],
+        )
+
+
+class ExpenseHistoryTests(ExpenseTestCase):
+    def history(self, expense_id):
+        return self.client.get(f"/api/v1/expenses/{expense_id}/history/")
+
+    def test_history_outlives_the_expense(self):
+        expense_id = self.create_expense()
+        self.delete_expense(expense_id)
+        response = self.history(expense_id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [entry["action"] for entry in response.json()["results"]],
+            ["deleted", "created"],
+        )
+
+        self.archive(expense_id)
+        self.assertFalse(Expense.all_objects.filter(id=expense_id).exists())
+        self.client.force_authenticate(self.bob)
+        self.assertEqual(self.history(expense_id).status_code, 200)
+
+    def test_history_of_an_id_that_is_not_a_number(self):
+        self.assertEqual(self.history("abc").status_code, 404)
+
+    def test_history_is_private(self):
+        expense_id = self.create_expense()
+        carol = User.objects.create_user(
+            "carol", "carol@example.com", "1234567892", "password-1"
+        )
+        self.client.force_authenticate(carol)
+        self.assertEqual(self.history(expense_id).status_code, 404)
+
+
+class ExpenseReceiptTests(ExpenseTestCase):
+    def setUp(self):
+        super().setUp()
+        location = tempfile.TemporaryDirectory()
+        self.addCleanup(location.cleanup)
+        settings = override_settings(RECEIPTS_ROOT=location.name, RECEIPT_VARIANTS={})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.expense_id = self.create_expense()
+
+    def upload(self):
+        image = io.BytesIO()
+        Image.new("RGB", (20, 10), "red").save(image, "PNG")
+        image.name = "receipt.png"
+        image.seek(0)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f"/api/v1/expenses/{self.expense_id}/receipts/",
+                {"file": image},
+                format="multipart",
+            )
+        self.assertEqual(response.status_code, 201, response.content)
+        return Receipt.objects.get(id=response.json()["id"])
+
+    def test_duplicate_upload_renews_the_file(self):
+        path = receipts.original_path(self.upload().sha256)
+        os.utime(path, (0, 0))
+        self.upload()
+        self.assertGreater(path.stat().st_mtime, time.time() - 60)
+
+    def test_id_that_is_not_a_number_is_not_found(self):
+        receipt = self.upload()
+        for url in (
+            "/api/v1/expenses/abc/receipts/",
+            f"/api/v1/expenses/abc/receipts/{receipt.id}/",
+            f"/api/v1/expenses/{self.expense_id}/receipts/abc/",
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_missing_file_is_not_found(self):
+        receipt = self.upload()
+        receipts.original_path(receipt.sha256).unlink()
+        response = self.client.get(
+            f"/api/v1/expenses/{self.expense_id}/receipts/{receipt.id}/"
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class CheckExpensesTests(ExpenseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.exact = self.create_expense(title="Exact")
+        ExpenseSplit.objects.filter(expense_id=self.exact, user=self.bob).update(
+            value=60
+        )
+        self.percentage = self.create_expense(
+            title="Percentage", split_type="PERCENTAGE"
+        )
+        ExpenseSplit.objects.filter(expense_id=self.percentage, user=self.bob).update(
+            value=30
+        )
+        self.owner_missing = self.create_expense(title="Owner missing")
+        self.drop_owner(self.owner_missing)
+        self.equal = self.create_expense(title="Equal")
+        Expense.objects.filter(id=self.equal).update(split_type=Expense.EQUAL)
+        self.drop_owner(self.equal)
+        self.create_expense(title="Fine")
+
+    def drop_owner(self, expense_id):
+        ExpenseSplit.objects.filter(expense_id=expense_id, user=self.alice).delete()
+        ExpenseSplit.objects.filter(expense_id=expense_id).update(value=100)
+
+    def check(self, *args):
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("check_expenses", *args, stdout=out, stderr=StringIO())
+        return {
+            record["expense"]: record
+            for record in map(json.loads, out.getvalue().splitlines())
+        }
+
+    def splits(self, expense_id):
+        return dict(
+            ExpenseSplit.objects.filter(expense_id=expense_id).values_list(
+                "user__username", "value"
+            )
+        )
+
+    def test_finds_every_violation(self):
+        report = self.check()
+        self.assertEqual(
+            {expense: record["violations"] for expense, record in report.items()},
+            {
+                self.exact: ["exact_total"],
+                self.percentage: ["percentage_total"],
+                self.owner_missing: ["owner_missing"],
+                self.equal: ["owner_missing"],
+            },
+        )
+        self.assertEqual(report[self.exact]["total"], "110.00")
+
+    def test_repairs_what_can_be_repaired(self):
+        report = self.check("--repair")
+        self.assertEqual(
+            {expense: record["repaired"] for expense, record in report.items()},
+            {
+                self.exact: True,
+                self.percentage: True,
+                self.owner_missing: True,
+                self.equal: False,
+            },
+        )
+        self.assertEqual(Expense.objects.get(id=self.exact).amount, Decimal(110))
+        self.assertEqual(
+            self.splits(self.percentage),
+            {"alice": Decimal("62.50"), "bob": Decimal("37.50")},
+        )
+        self.assertEqual(
+            self.splits(self.owner_missing), {"alice": Decimal(0), "bob": Decimal(100)}
+        )
+        self.assertEqual(list(self.check()), [self.equal])
+        self.assertEqual(
+            self.client.get(f"/api/v1/expenses/{self.exact}/history/").json()[
+                "results"
+            ][0]["changes"]["amount"],
+            ["100.00", "110.00"],
+        )
+
+
+class SpendAnalyticsTests(ExpenseTestCase):
+    def create_on(self, day, amount=100, **kwargs):
+        created = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+        with mock.patch("django.utils.timezone.now", return_value=created):
+            return self.create_expense(amount, **kwargs)
+
+    def spend(self, query=""):
+        response = self.client.get(
+            f"/api/v1/analytics/spend?from=2024-01-01&to=2024-02-29&{query}"
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return [
+            (row["period"], row["own"], row["shared"])
+            for row in response.json()["series"]
+        ]
+
+    def rollups(self):
+        return {
+            (user_id, day, currency): (own, shared)
+            for user_id, day, currency, own, shared in SpendRollup.objects.values_list(
+                "user_id", "day", "currency", "own", "shared"
+            )
+            if own or shared
+        }
+
+    def test_buckets_split_own_and_shared(self):
+        self.create_on(date(2024, 1, 1))
+        self.create_on(date(2024, 1, 3), 60)
+        self.client.force_authenticate(self.bob)
+        self.create_on(date(2024, 2, 10), 40)
+        self.client.force_authenticate(self.alice)
+
+        self.assertEqual(
+            self.spend(),
+            [
+                ("2024-01-01", "50.00", "0.00"),
+                ("2024-01-03", "30.00", "0.00"),
+                ("2024-02-10", "0.00", "20.00"),
+            ],
+        )
+        self.assertEqual(
+            self.spend("bucket=week"),
+            [("2024-01-01", "80.00", "0.00"), ("2024-02-05", "0.00", "20.00")],
+        )
+        self.assertEqual(
+            self.spend("bucket=month"),
+            [("2024-01-01", "80.00", "0.00"), ("2024-02-01", "0.00", "20.00")],
+        )
+
+        self.client.force_authenticate(self.bob)
+        self.assertEqual(
+            self.spend("bucket=month"),
+            [("2024-01-01", "0.00", "80.00"), ("2024-02-01", "20.00", "0.00")],
+        )
+
+    @override_settings(FX_RATES_TTL=0)
+    def test_amounts_are_converted_to_the_home_currency(self):
+        self.create_on(date(2024, 1, 1), 180)
+        FxRate.objects.create(currency="EUR", as_of="2023-01-01", rate="90")
+        self.alice.home_currency = "EUR"
+        self.alice.save(update_fields=["home_currency"])
+        self.assertEqual(self.spend(), [("2024-01-01", "1.00", "0.00")])
+
+    def test_invalid_parameters_are_rejected(self):
+        for query in ("bucket=year", "from=yesterday"):
+            with self.subTest(query=query):
+                response = self.client.get(f"/api/v1/analytics/spend?{query}")
+                self.assertEqual(response.status_code, 400)
+
+    def test_updates_replace_the_old_amounts(self):
+        expense_id = self.create_on(date(2024, 1, 1))
+        self.update_expense(
+            expense_id,
+            60,
+            participants=[
+                {"user": "alice", "value": 20},
+                {"user": "bob", "value": 40},
+            ],
+        )
+        self.assertEqual(self.spend(), [("2024-01-01", "20.00", "0.00")])
+
+        self.update_expense(
+            expense_id,
+            200,
+            split_type="PERCENTAGE",
+            participants=[
+                {"user": "alice", "value": 25},
+                {"user": "bob", "value": 75},
+            ],
+        )
+        self.assertEqual(self.spend(), [("2024-01-01", "50.00", "0.00")])
+        self.client.force_authenticate(self.bob)
+        self.assertEqual(self.spend(), [("2024-01-01", "0.00", "150.00")])
+
+    def test_rebuild_matches_the_maintained_rollups(self):
+        self.create_on(date(2024, 1, 1))
+        updated = self.create_on(date(2024, 1, 1), 60)
+        self.update_expense(
+            updated,
+            90,
+            split_type="PERCENTAGE",
+            participants=[
+                {"user": "alice", "value": 40},
+                {"user": "bob", "value": 60},
+            ],
+        )
+        deleted = self.create_on(date(2024, 1, 2), 40)
+        self.delete_expense(deleted)
+        archived = self.create_on(date(2024, 1, 3), 80)
+        self.archive(archived)
+        self.client.force_authenticate(self.bob)
+        self.create_on(date(2024, 1, 3), 20)
+
+        maintained = self.rollups()
+        call_command("rebuild_spend_rollups", stdout=StringIO())
+        self.assertEqual(self.rollups(), maintained)
+
+
+class RecurringExpenseTests(ExpenseTestCase):
+    def test_backfilled_occurrences_are_dated_to_their_period(self):
+        today = timezone.localdate()
+        response = self.client.post(
+            "/api/v1/recurring-expenses/",
+            {
+                "title": "Rent",
+                "amount": 100,
+                "split_type": "EXACT",
+                "rule": "DAILY",
+                "start_date": str(today - timedelta(days=2)),
+                "participants": [
+                    {"user": "alice", "value": 50},
+                    {"user": "bob", "value": 50},
+                ],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("run_recurring_expenses", stdout=StringIO())
+
+        expenses = Expense.objects.order_by("period")
+        self.assertEqual(
+            [timezone.localdate(expense.created) for expense in expenses],
+            [expense.period for expense in expenses],
+        )
+        self.assertEqual(
+            sorted(
+                SpendRollup.objects.filter(user=self.alice).values_list(
+                    "day", flat=True
+                )
+            ),
+            [expense.period for expense in expenses],
+        )
+
+
+@override_settings(FX_RATES_TTL=0)
+class ExpenseCurrencyTests(ExpenseTestCase):
+    def test_currency_needs_an_exchange_rate(self):
+        data = {
+            "title": "Dinner",
+            "amount": 100,
+            "currency": "EUR",
+            "split_type": "EXACT",
+            "participants": [
+                {"user": "alice", "value": 50},
+                {"user": "bob", "value": 50},
+            ],
+        }
+        for currency in ("EUR", "ZZZ", "EURO"):
+            with self.subTest(currency=currency):
+                response = self.client.post(
+                    "/api/v1/expenses/",
+                    {**data, "currency": currency},
+                    format="json",
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("currency", response.json())
+
+        FxRate.objects.create(currency="EUR", as_of="2024-01-01", rate="90")
+        self.create_expense(currency="eur")
+        self.assertEqual(Expense.objects.get().currency, "EUR")
+
+
+class GenerateFixturesTests(TestCase):
+    def generate(self, prefix, **options):
+        call_command(
+            "generate_fixtures",
+            users=5,
+            expenses=20,
+            prefix=prefix,
+            skip_rollups=True,
+            stdout=StringIO(),
+            **options,
+        )
+        return list(
+            Expense.objects.filter(owner__username__startswith=prefix)
+            .order_by("id")
+            .values_list("title", "amount", "currency", "split_type", "created")
+        )
+
+    def test_same_seed_generates_the_same_data(self):
+        first = self.generate("first_", seed=1)
+        self.assertEqual(len(first), 20)
+        self.assertEqual(self.generate("second_", seed=1), first)
+        self.assertNotEqual(self.generate("third_", seed=2), first)
+
+    def test_dates_end_before_the_end_date(self):
+        expenses = self.generate("first_", end_date=date(2024, 1, 1), days=10)
+        self.assertTrue(
+            all(
+                date(2023, 12, 22) <= timezone.localdate(created) < date(2024, 1, 1)
+                for *_, created in expenses
+            )
+        )
+
+
+class LoadFxRatesTests(TestCase):
+    def load(self, content):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv") as f:
+            f.write(content)
+            f.flush()
+            call_command("load_fx_rates", f.name, stdout=StringIO())
+
+    def test_rates_must_be_positive(self):
+        for rate in ("0", "-1.5", "NaN"):
+            with self.subTest(rate=rate):
+                with self.assertRaisesMessage(CommandError, "line 3"):
+                    self.load(
+                        f"currency,as_of,rate\nEUR,2024-01-01,1.1\nGBP,2024-01-01,{rate}\n"
+                    )
+        self.assertFalse(FxRate.objects.exists())
+
+
+class ExpenseEventsTests(TestCase):
+    url = "/api/v1/expenses/events"
+
+    def test_wsgi_request_is_refused(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 501)
+
+    async def test_asgi_request_needs_a_token(self):
+        response = await AsyncClient().get(self.url)
+        self.assertEqual(response.status_code, 401)
@@ -2,21 +2,29 @@ from django.urls import path
 from rest_framework import routers
 from .views import (
     ExpenseViewSet,
+    RecurringExpenseViewSet,
     participants_expenses,
     participant_expense_detail,
     my_total_expense,
     download_single_expense,
+    expense_events,
+    spend_analytics,
 )
 
 router = routers.SimpleRouter()
 
 router.register(r"expenses", ExpenseViewSet, basename="expense")
+router.register(
+    r"recurring-expenses", RecurringExpenseViewSet, basename="recurring-expense"
+)
 
 
 urlpatterns = [
     *router.urls,
+    path("expenses/events", expense_events),
     path("expenses/share", participants_expenses),
     path("expenses/share/<int:pk>", participant_expense_detail),
     path("expenses/share/<int:pk>/download", download_single_expense),
     path("my-expense/download", my_total_expense),
+    path("analytics/spend", spend_analytics),
 ]
@@ -3,25 +3,99 @@
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from io import BytesIO
+from datetime import date, datetime, timedelta
+import asyncio
 
-
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.db import transaction
-from django.http import HttpResponse
+from django.db.models import F, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+from django.http import (
+    FileResponse,
+    HttpResponse,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework import viewsets
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import (
+    action,
+    api_view,
+    permission_classes,
+    throttle_classes,
+)
 from rest_framework import filters
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
 from django.contrib.auth import get_user_model
-from .models import Expense, ExpenseSplit
-
-from .serializers import ExpenseSerializer
+from django_filters.rest_framework import DjangoFilterBackend
+from backend.throttling import PDFThrottle, UserTokenBucketThrottle
+from .audit import audit_on_commit
+from .cache import expense_list_cache, invalidate_on_commit
+from .events import EXPENSE_DELETED, format_sse, get_broker, publish_on_commit
+from .filters import ArchivedExpenseFilter, ExpenseFilter
+from .fx import MissingRate, get_rate_table
+from .idempotency import idempotent
+from . import receipts
+from .models import (
+    ArchivedExpense,
+    ArchivedExpenseSplit,
+    AuditEntry,
+    Expense,
+    ExpenseSplit,
+    Receipt,
+    RecurringExpense,
+    SpendRollup,
+)
+from .rollups import record_expenses
+
+from .serializers import (
+    AuditEntrySerializer,
+    ExpenseSerializer,
+    ReceiptSerializer,
+    RecurringExpenseSerializer,
+    _decimal_representation,
+    serialize_expenses,
+)
 from user.models import User
 
 
+class HistoryPagination(LimitOffsetPagination):
+    default_limit = 50
+    max_limit = 200
+
+
+def include_archived(request):
+    """Whether the client opted into `?include_archived=true`."""
+    value = request.query_params.get("include_archived", "")
+    return value.lower() in ("1", "true", "yes")
+
+
+def with_archive(data, queryset, ordering=()):
+    """
+    Add the archived expenses in `queryset` to the serialized hot ones, keeping
+    `ordering` (field names, "-" prefixed for descending) across both.
+    """
+    data = data + serialize_expenses(queryset.order_by(*ordering), ArchivedExpenseSplit)
+    for field in reversed(ordering):
+        name = field.lstrip("-")
+        data.sort(
+            key=lambda expense: datetime.fromisoformat(expense[name]),
+            reverse=field.startswith("-"),
+        )
+    return data
+
+
 class ExpenseViewSet(viewsets.ModelViewSet):
-    filter_backends = [filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_class = ExpenseFilter
     # for ordering each expense
     ordering_fields = ["updated", "created"]
     ordering = ["-updated"]
@@ -38,7 +112,30 @@ class ExpenseViewSet(viewsets.ModelViewSet):
         self.check_object_permissions(self.request, obj)
         return obj
 
+    def list(self, request, *args, **kwargs):
+        key = expense_list_cache.key(request.user.id, "mine", request.query_params)
+        data = expense_list_cache.get(key)
+        if data is None:
+            queryset = self.filter_queryset(self.get_queryset())
+            data = serialize_expenses(queryset)
+            if include_archived(request):
+                archived = ArchivedExpenseFilter(
+                    request.query_params,
+                    queryset=ArchivedExpense.objects.filter(
+                        owner=request.user, deleted_at__isnull=True
+                    ),
+                )
+                ordering = filters.OrderingFilter().get_ordering(
+                    request, queryset, self
+                )
+                data = with_archive(data, archived.qs, ordering)
+            expense_list_cache.set(key, data)
+        return Response(data)
+
     def create(self, request, *args, **kwargs):
+        return idempotent(request, lambda: self.create_expense(request))
+
+    def create_expense(self, request):
         user_model = get_user_model()
         id = request.user.id
 
@@ -55,10 +152,27 @@ class ExpenseViewSet(viewsets.ModelViewSet):
         instance = self.get_object()
         try:
             with transaction.atomic():
-                # Delete related ExpenseSplit instances
-                ExpenseSplit.objects.filter(expense=instance).delete()
-
-                # Delete the Expense instance
+                participant_ids = list(
+                    ExpenseSplit.objects.filter(expense=instance).values_list(
+                        "user_id", flat=True
+                    )
+                )
+                record_expenses([instance.id], sign=-1)
+                audit_on_commit(
+                    [
+                        AuditEntry(
+                            expense_id=instance.id,
+                            actor=request.user,
+                            action=AuditEntry.DELETED,
+                            changes={},
+                        )
+                    ]
+                )
+                publish_on_commit(EXPENSE_DELETED, instance.id, participant_ids)
+                invalidate_on_commit(participant_ids + [instance.owner_id])
+
+                # Leave a tombstone, the row and its splits are moved out by
+                # `manage.py archive_expenses` later
                 self.perform_destroy(instance)
         except Exception as e:
             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -68,20 +182,206 @@ class ExpenseViewSet(viewsets.ModelViewSet):
     def perform_update(self, serializer):
         serializer.save()
 
+    def perform_destroy(self, instance):
+        instance.deleted_at = timezone.now()
+        instance.save(update_fields=["deleted_at", "updated"])
+
+    @action(detail=True, methods=["get"])
+    def history(self, request, pk=None):
+        """
+        Changes made to an expense, newest first. Open to its owner and
+        participants, also once the expense is deleted or archived.
+        """
+        user = request.user
+        involved = Q(owner=user) | Q(expensesplit__user=user)
+        try:
+            visible = (
+                Expense.all_objects.filter(involved, id=pk).exists()
+                or ArchivedExpense.objects.filter(involved, id=pk).exists()
+            )
+        except ValueError:
+            # the router lets through ids that aren't numbers
+            visible = False
+        if not visible:
+            return Response(
+                {"detail": "There is no such transactions"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        entries = (
+            AuditEntry.objects.filter(expense_id=pk)
+            .select_related("actor")
+            .order_by("-id")
+        )
+        paginator = HistoryPagination()
+        page = paginator.paginate_queryset(entries, request, view=self)
+        serializer = AuditEntrySerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    def visible_expense(self, pk):
+        """The expense if the user owns it or takes part in it, else None."""
+        user = self.request.user
+        try:
+            return (
+                Expense.objects.filter(
+                    Q(owner=user) | Q(expensesplit__user=user), id=pk
+                )
+                .distinct()
+                .first()
+            )
+        except ValueError:
+            # the router lets through ids that aren't numbers
+            return None
+
+    @action(detail=True, methods=["get", "post"], parser_classes=[MultiPartParser])
+    def receipts(self, request, pk=None):
+        """
+        GET lists the receipts of an expense, POST uploads one (owner only) as
+        the `file` field of a multipart form.
+        """
+        expense = self.visible_expense(pk)
+        if expense is None:
+            return Response(
+                {"detail": "There is no such transactions"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        if request.method == "GET":
+            queryset = Receipt.objects.filter(expense_id=expense.id).order_by("id")
+            return Response(ReceiptSerializer(queryset, many=True).data)
+
+        if expense.owner_id != request.user.id:
+            return Response(
+                {"detail": "Only the owner can add receipts."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        # Must be in place before the body is parsed
+        handler = receipts.ReceiptUploadHandler(request)
+        request.upload_handlers = [handler]
+        upload = request.FILES.get("file")
+        if handler.too_large:
+            return Response(
+                {"detail": "Receipt is too large."},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+        if upload is None:
+            return Response(
+                {"detail": "Upload the receipt as the `file` field."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            content_type = receipts.store(upload)
+        except receipts.InvalidReceipt as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            receipt = Receipt.objects.create(
+                expense_id=expense.id,
+                sha256=upload.sha256,
+                name=upload.name[:255],
+                content_type=content_type,
+                size=upload.size,
+                uploaded_by=request.user,
+            )
+            receipts.make_variants_on_commit(upload.sha256)
+        return Response(ReceiptSerializer(receipt).data, status=status.HTTP_201_CREATED)
+
+    @action(
+        detail=True,
+        methods=["get", "delete"],
+        url_path=r"receipts/(?P<receipt_id>\d+)",
+    )
+    def receipt(self, request, pk=None, receipt_id=None):
+        """
+        GET sends the receipt file, or `?variant=` one of RECEIPT_VARIANTS,
+        honouring single `Range` requests. DELETE (owner only) detaches it;
+        unreferenced files are removed by `manage.py purge_receipt_files`.
+        """
+        expense = self.visible_expense(pk)
+        receipt = None
+        if expense is not None:
+            receipt = Receipt.objects.filter(
+                id=receipt_id, expense_id=expense.id
+            ).first()
+        if receipt is None:
+            return Response(
+                {"detail": "There is no such receipt"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        if request.method == "DELETE":
+            if expense.owner_id != request.user.id:
+                return Response(
+                    {"detail": "Only the owner can remove receipts."},
+                    status=status.HTTP_403_FORBIDDEN,
+                )
+            receipt.delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        variant = request.query_params.get("variant", "original")
+        if variant == "original":
+            path = receipts.original_path(receipt.sha256)
+            content_type = receipt.content_type
+        elif variant in settings.RECEIPT_VARIANTS:
+            path = receipts.variant_path(receipt.sha256, variant)
+            content_type = "image/jpeg"
+            if not path.exists():
+                return Response(
+                    {"detail": "This variant is not ready yet."},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+        else:
+            return Response(
+                {"detail": "Unknown variant."}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return receipt_file_response(request, path, content_type, variant)
+
+
+class RecurringExpenseViewSet(viewsets.ModelViewSet):
+    http_method_names = ["get", "post", "put", "delete"]
+    permission_classes = (IsAuthenticated,)
+    serializer_class = RecurringExpenseSerializer
+
+    def get_queryset(self):
+        return RecurringExpense.objects.filter(owner=self.request.user).order_by(
+            "next_run"
+        )
+
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def participants_expenses(request):
     user = request.user
-    queryset = (
-        Expense.objects.filter(expensesplit__user=user).exclude(owner=user).distinct()
-    )
-
-    if not queryset.exists():
+    key = expense_list_cache.key(user.id, "shared", request.query_params)
+    data = expense_list_cache.get(key)
+    if data is None:
+        queryset = (
+            Expense.objects.filter(expensesplit__user=user)
+            .exclude(owner=user)
+            .distinct()
+        )
+        filterset = ExpenseFilter(request.query_params, queryset=queryset)
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serialize_expenses(filterset.qs)
+        if include_archived(request):
+            archived = ArchivedExpenseFilter(
+                request.query_params,
+                queryset=ArchivedExpense.objects.filter(
+                    expensesplit__user=user, deleted_at__isnull=True
+                )
+                .exclude(owner=user)
+                .distinct(),
+            )
+            data = with_archive(data, archived.qs)
+        expense_list_cache.set(key, data)
+
+    if not data:
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    serializer = ExpenseSerializer(queryset, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    return Response(data, status=status.HTTP_200_OK)
 
 
 @api_view(["GET"])
@@ -107,9 +407,33 @@ def participant_expense_detail(request, pk):
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@throttle_classes([UserTokenBucketThrottle, PDFThrottle])
 def my_total_expense(request):
     user = request.user
-    splits = ExpenseSplit.objects.filter(user=user)
+    splits = ExpenseSplit.objects.filter(
+        user=user, expense__deleted_at__isnull=True
+    ).select_related("expense")
+
+    # The total is summed in SQL per currency and day, so converting it to the
+    # user's home currency costs one rate lookup per group, not per split.
+    totals = (
+        splits.values("expense__currency", day=TruncDate("expense__created"))
+        .annotate(spent=Sum(ExpenseSplit.spent_expression()))
+        .order_by()
+    )
+    rates = get_rate_table()
+    try:
+        total_amount = sum(
+            rates.convert(
+                group["spent"],
+                group["expense__currency"],
+                user.home_currency,
+                group["day"],
+            )
+            for group in totals
+        )
+    except MissingRate as e:
+        return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     # Create a BytesIO buffer to hold the PDF data
     buffer = BytesIO()
@@ -131,7 +455,6 @@ def my_total_expense(request):
     y -= 20
     p.line(50, y + 5, width - 50, y + 5)
     y -= 20
-    total_amount = 0
 
     for split in splits:
         if split.expense.split_type == Expense.PERCENTAGE:
@@ -141,17 +464,16 @@ def my_total_expense(request):
 
         p.drawString(50, y, str(split.expense.created.strftime("%Y-%m-%d")))
         p.drawString(150, y, split.expense.title)
-        p.drawString(250, y, str(split.expense.amount))
+        p.drawString(250, y, f"{split.expense.amount} {split.expense.currency}")
         p.drawString(350, y, split.expense.split_type)
-        p.drawString(450, y, str(value))
+        p.drawString(450, y, f"{value} {split.expense.currency}")
 
         y -= 20
         p.line(50, y + 5, width - 50, y + 5)
         y -= 20
-        total_amount += value
 
     p.drawString(50, y, "Total amount Spent")
-    p.drawString(450, y, str(total_amount))
+    p.drawString(450, y, f"{round(total_amount, 2)} {user.home_currency}")
 
     p.showPage()
     p.save()
@@ -169,6 +491,7 @@ def my_total_expense(request):
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@throttle_classes([UserTokenBucketThrottle, PDFThrottle])
 def download_single_expense(request, pk):
     user = request.user
     try:
@@ -192,7 +515,9 @@ def download_single_expense(request, pk):
     p.setFont("Helvetica-Bold", 14)
     p.drawString(50, height - 100, f"Title: {expense.title}")
     p.drawString(50, height - 120, f"Spend by: {expense.owner}")
-    p.drawString(50, height - 140, f"Totla Spent amount : {expense.amount} INR")
+    p.drawString(
+        50, height - 140, f"Totla Spent amount : {expense.amount} {expense.currency}"
+    )
     p.drawString(50, height - 160, f"Expense Type: {expense.split_type}")
     p.drawString(50, height - 180, f"Date: {expense.created.strftime('%Y-%m-%d')}")
 
@@ -226,3 +551,181 @@ def download_single_expense(request, pk):
     response["Content-Disposition"] = f'attachment; filename="expense_{pk}.pdf"'
 
     return response
+
+
+SPEND_BUCKETS = {"day": None, "week": TruncWeek, "month": TruncMonth}
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def spend_analytics(request):
+    """
+    Spend series of the user, split into own and shared expenses, in the
+    user's home currency. Read from the daily rollups, so a year of data is at
+    most 365 rows per currency whatever the size of the split history.
+    """
+    user = request.user
+    bucket = request.query_params.get("bucket", "day")
+    if bucket not in SPEND_BUCKETS:
+        return Response(
+            {"detail": "bucket must be one of day, week, month."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        end = date.fromisoformat(
+            request.query_params.get("to", timezone.localdate().isoformat())
+        )
+        start = date.fromisoformat(
+            request.query_params.get("from", (end - timedelta(days=364)).isoformat())
+        )
+    except ValueError:
+        return Response(
+            {"detail": "from and to must be dates in YYYY-MM-DD format."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    rollups = SpendRollup.objects.filter(user=user, day__range=(start, end))
+    trunc = SPEND_BUCKETS[bucket]
+    period = trunc("day") if trunc else F("day")
+    rows = (
+        rollups.values("currency", period=period)
+        .annotate(own=Sum("own"), shared=Sum("shared"))
+        .order_by("period")
+    )
+
+    rates = get_rate_table()
+    series = {}
+    try:
+        for row in rows:
+            own, shared = series.get(row["period"], (0, 0))
+            series[row["period"]] = (
+                own
+                + rates.convert(
+                    row["own"], row["currency"], user.home_currency, row["period"]
+                ),
+                shared
+                + rates.convert(
+                    row["shared"], row["currency"], user.home_currency, row["period"]
+                ),
+            )
+    except MissingRate as e:
+        return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(
+        {
+            "bucket": bucket,
+            "from": start,
+            "to": end,
+            "currency": user.home_currency,
+            "series": [
+                {
+                    "period": period,
+                    "own": _decimal_representation(own),
+                    "shared": _decimal_representation(shared),
+                }
+                for period, (own, shared) in series.items()
+            ],
+        },
+        status=status.HTTP_200_OK,
+    )
+
+
+def receipt_file_response(request, path, content_type, variant):
+    """
+    Send a stored receipt file. Files never change under their content hash,
+    so clients and proxies may cache them for good.
+    """
+    etag = f'"{path.name}"'
+    if request.headers.get("If-None-Match") == etag:
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+    elif settings.RECEIPTS_SENDFILE_HEADER:
+        # the web server reads the file and handles ranges itself
+        response = HttpResponse(content_type=content_type)
+        if settings.RECEIPTS_SENDFILE_HEADER == "X-Sendfile":
+            response["X-Sendfile"] = str(path)
+        else:
+            response[settings.RECEIPTS_SENDFILE_HEADER] = (
+                settings.RECEIPTS_SENDFILE_PREFIX
+                + path.relative_to(receipts.root()).as_posix()
+            )
+    else:
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            # removed from disk while still referenced
+            return Response(
+                {"detail": "There is no such receipt"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        try:
+            byte_range = receipts.parse_range(request.headers.get("Range"), size)
+        except ValueError:
+            response = HttpResponse(
+                status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+            )
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+        if byte_range is None:
+            # FileResponse hands the open file to wsgi.file_wrapper, which
+            # servers implement with sendfile()
+            response = FileResponse(open(path, "rb"), content_type=content_type)
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                receipts.read_range(path, start, end),
+                status=status.HTTP_206_PARTIAL_CONTENT,
+                content_type=content_type,
+            )
+            response["Content-Length"] = end - start + 1
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Accept-Ranges"] = "bytes"
+
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, max-age=31536000, immutable"
+    return response
+
+
+async def expense_events(request):
+    """
+    Server-sent events stream of changes to expenses the user takes part in.
+    Needs to be served by an ASGI server so that idle connections don't hold
+    a worker thread each.
+    """
+    if not isinstance(request, ASGIRequest):
+        # Under WSGI the endless stream would be buffered, never sent, and
+        # hold its worker thread for good.
+        return JsonResponse(
+            {"detail": "Expense events are only available when served over ASGI."},
+            status=501,
+        )
+    try:
+        auth = await sync_to_async(JWTAuthentication().authenticate)(request)
+    except AuthenticationFailed as e:
+        return JsonResponse({"detail": str(e.detail)}, status=401)
+    if auth is None:
+        return JsonResponse(
+            {"detail": "Authentication credentials were not provided."}, status=401
+        )
+    user, _ = auth
+    keepalive = getattr(settings, "EXPENSE_EVENTS_KEEPALIVE", 15)
+
+    async def stream():
+        broker = get_broker()
+        subscription = broker.subscribe(user.id)
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    event = await subscription.get(timeout=keepalive)
+                except asyncio.TimeoutError:
+                    # comment line keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            broker.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
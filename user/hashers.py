@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher,
+    PBKDF2PasswordHasher,
+    ScryptPasswordHasher,
+)
+
+# Parameters are read from PASSWORD_HASHER_PARAMS. Changing them makes the
+# hasher report existing hashes as outdated, so Django re-hashes each password
+# with the new parameters the next time its owner logs in.
+_params = getattr(settings, "PASSWORD_HASHER_PARAMS", {})
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    iterations = _params.get("pbkdf2_iterations", PBKDF2PasswordHasher.iterations)
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    work_factor = _params.get("scrypt_work_factor", ScryptPasswordHasher.work_factor)
+    block_size = _params.get("scrypt_block_size", ScryptPasswordHasher.block_size)
+    parallelism = _params.get("scrypt_parallelism", ScryptPasswordHasher.parallelism)
+    # scrypt needs about 128 * n * r bytes, leave headroom above OpenSSL's default
+    maxmem = 256 * work_factor * block_size
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """Needs the optional argon2-cffi package."""
+
+    time_cost = _params.get("argon2_time_cost", Argon2PasswordHasher.time_cost)
+    memory_cost = _params.get("argon2_memory_cost", Argon2PasswordHasher.memory_cost)
+    parallelism = _params.get("argon2_parallelism", Argon2PasswordHasher.parallelism)
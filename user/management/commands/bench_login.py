@@ -0,0 +1,45 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from backend.benchmarks import rolled_back
+from user.models import User
+from user.serializers import UserLoginSerializer
+
+
+class Command(BaseCommand):
+    help = "Measure login throughput (password check and token issuance) per hasher"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--logins", type=int, default=50)
+
+    def handle(self, *args, **options):
+        for hasher in settings.PASSWORD_HASHERS:
+            # the hasher under test goes first, so passwords are hashed with it
+            hashers = [hasher] + [h for h in settings.PASSWORD_HASHERS if h != hasher]
+            with override_settings(PASSWORD_HASHERS=hashers):
+                try:
+                    with rolled_back():
+                        self.bench(hasher, options["logins"])
+                except ValueError as e:
+                    # hasher whose optional library isn't installed
+                    self.stdout.write(f"{hasher}: skipped ({e})")
+
+    def bench(self, hasher, logins):
+        password = "bench-password-1"
+        User.objects.create_user(
+            "bench_login", "bench_login@example.com", "0000000000", password
+        )
+        credentials = {"email": "bench_login@example.com", "password": password}
+
+        start = time.perf_counter()
+        for _ in range(logins):
+            UserLoginSerializer(data=credentials).is_valid(raise_exception=True)
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(
+            f"{hasher}: {logins / elapsed:.1f} logins/s, "
+            f"{elapsed / logins * 1000:.1f} ms/login"
+        )
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-19 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='home_currency',
+            field=models.CharField(default='INR', max_length=3),
+        ),
+    ]
@@ -61,6 +61,7 @@ class UserManager(BaseUserManager):
         user.is_superuser = True
         user.is_staff = True
         user.save(using=self._db)
+        return user
 
 
 class User(AbstractBaseUser, PermissionsMixin):
@@ -70,6 +71,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     email = models.EmailField(db_index=True, unique=True)
     # Here we assuming all the mobile number have 10 digits and from india
     mobile_number = models.CharField(db_index=True, max_length=10)
+    # balances and summaries are converted into this currency
+    home_currency = models.CharField(max_length=3, default="INR")
     is_active = models.BooleanField(default=True)
     is_superuser = models.BooleanField(default=False)
     is_staff = models.BooleanField(default=False)
@@ -0,0 +1,10 @@
+from rest_framework.permissions import SAFE_METHODS, BasePermission
+
+
+class IsSelfOrSuperuser(BasePermission):
+    """Anyone signed in can read an account, only its user or a superuser can change it."""
+
+    def has_object_permission(self, request, view, obj):
+        if request.method in SAFE_METHODS:
+            return True
+        return obj == request.user or request.user.is_superuser
@@ -5,6 +5,7 @@ from rest_framework_simplejwt.settings import api_settings
 from django.contrib.auth.models import update_last_login
 
 
+from expense.serializers import validate_currency_code
 from user.models import User
 
 
@@ -21,11 +22,15 @@ class UserSerializer(serializers.ModelSerializer):
             "last_name",
             "email",
             "mobile_number",
+            "home_currency",
             "created",
             "updated",
         ]
         read_only_fields = ["is_active"]
 
+    def validate_home_currency(self, value):
+        return validate_currency_code(value)
+
 
 class UserRegisterSerializer(UserSerializer):
     """
@@ -55,14 +60,37 @@ class UserRegisterSerializer(UserSerializer):
         return User.objects.create_user(**validated_data)
 
 
+_datetime_field = serializers.DateTimeField()
+
+
+def user_data(user):
+    """
+    Same output as `UserSerializer(user).data`, without building a serializer
+    and its fields for every login.
+    """
+    return {
+        "id": user.id,
+        "username": user.username,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "email": user.email,
+        "mobile_number": user.mobile_number,
+        "home_currency": user.home_currency,
+        "created": _datetime_field.to_representation(user.created),
+        "updated": _datetime_field.to_representation(user.updated),
+    }
+
+
 class UserLoginSerializer(TokenObtainPairSerializer):
     def validate(self, attrs: Dict[str, Any]) -> Dict[str, str]:
-        data = super().validate(attrs)
+        # TokenObtainSerializer.validate only authenticates the user, the token
+        # pair is minted once below rather than also in TokenObtainPairSerializer
+        data = super(TokenObtainPairSerializer, self).validate(attrs)
         refresh = self.get_token(self.user)
 
-        data["user"] = UserSerializer(self.user).data
         data["refresh"] = str(refresh)
         data["access"] = str(refresh.access_token)
+        data["user"] = user_data(self.user)
 
         if api_settings.UPDATE_LAST_LOGIN:
             update_last_login(None, self.user)
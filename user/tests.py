@@ -1,3 +1,93 @@
-from django.test import TestCase
+from django.core.cache import cache
+from rest_framework import status
+from django.test import override_settings
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from expense.models import FxRate
+from user.models import User
+
+
+class UserViewSetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(
+            "alice", "alice@example.com", "1234567890", "password-1"
+        )
+        self.bob = User.objects.create_user(
+            "bob", "bob@example.com", "1234567891", "password-1"
+        )
+
+    def url(self, user):
+        return f"/api/v1/auth/users/{user.id}/"
+
+    def test_anonymous_requests_are_rejected(self):
+        response = self.client.patch(
+            self.url(self.alice), {"username": "mallory"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(
+            self.client.get("/api/v1/auth/users/").status_code,
+            status.HTTP_401_UNAUTHORIZED,
+        )
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.username, "alice")
+
+    def test_user_can_only_patch_themselves(self):
+        self.client.force_authenticate(self.bob)
+        response = self.client.patch(
+            self.url(self.alice), {"email": "bob@evil.com"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.email, "alice@example.com")
+
+        # reading someone else's account is still fine
+        response = self.client.get(self.url(self.alice))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.patch(
+            self.url(self.bob), {"first_name": "Robert"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.bob.refresh_from_db()
+        self.assertEqual(self.bob.first_name, "Robert")
+
+    def test_superuser_can_patch_anyone(self):
+        root = User.objects.create_superuser(
+            "root", "root@example.com", "1234567892", "password-1"
+        )
+        self.client.force_authenticate(root)
+        response = self.client.patch(
+            self.url(self.alice), {"first_name": "Alicia"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.first_name, "Alicia")
+
+    def test_search_matches_prefixes(self):
+        User.objects.create_user("alina", "zz@example.com", "9999999999", "password-1")
+        self.client.force_authenticate(self.bob)
+        response = self.client.get("/api/v1/auth/users/search/?q=al")
+        self.assertEqual(
+            [user["username"] for user in response.json()], ["alice", "alina"]
+        )
+        response = self.client.get("/api/v1/auth/users/search/?q=99")
+        self.assertEqual([user["username"] for user in response.json()], ["alina"])
+        response = self.client.get("/api/v1/auth/users/search/?q=Al")
+        self.assertEqual(response.json(), [])
+
+    @override_settings(FX_RATES_TTL=0)
+    def test_home_currency_needs_an_exchange_rate(self):
+        self.client.force_authenticate(self.alice)
+        response = self.client.patch(
+            self.url(self.alice), {"home_currency": "eur"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        FxRate.objects.create(currency="EUR", as_of="2024-01-01", rate="90")
+        response = self.client.patch(
+            self.url(self.alice), {"home_currency": "eur"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.home_currency, "EUR")
@@ -1,33 +1,131 @@
-from django.shortcuts import render
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.shortcuts import render, get_object_or_404
 from rest_framework import viewsets
-from rest_framework.permissions import AllowAny
+from rest_framework.decorators import action
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.permissions import AllowAny, IsAuthenticated
 
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
 from rest_framework_simplejwt.views import TokenRefreshView
 
+from backend.throttling import LoginThrottle
+
 # Create your views here.
 
 from user.serializers import UserSerializer, UserRegisterSerializer, UserLoginSerializer
 from user.models import User
+from user.permissions import IsSelfOrSuperuser
+
+SEARCH_MAX_LIMIT = 25
+RESOLVE_MAX_USERNAMES = 100
+
+
+class UserPagination(LimitOffsetPagination):
+    default_limit = 50
+    max_limit = 200
 
 
 class UserViewSet(viewsets.ModelViewSet):
     http_method_names = ("patch", "get")
-    permission_classes = (AllowAny,)
+    permission_classes = (IsAuthenticated, IsSelfOrSuperuser)
     serializer_class = UserSerializer
+    pagination_class = UserPagination
 
     def get_queryset(self):
         if self.request.user.is_superuser:
-            return User.objects.all()
-        return User.objects.exclude(is_superuser=True)
+            return User.objects.all().order_by("id")
+        return User.objects.exclude(is_superuser=True).order_by("id")
 
     def get_object(self):
-        obj = User.objects.get_object_by_public_id(self.kwargs["pk"])
+        obj = get_object_or_404(self.get_queryset(), id=self.kwargs["pk"])
         self.check_object_permissions(self.request, obj)
         return obj
 
+    @action(detail=False)
+    def search(self, request):
+        """
+        Participant autocomplete: users whose username, email or mobile number
+        starts with `q`, case-sensitively. Each column is searched on its own
+        with a range rather than startswith: SQLite's LIKE ignores case and so
+        can't use the index, a range is a seek on any database.
+        """
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            return Response(
+                {"detail": "q is required."}, status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = int(request.query_params.get("limit", 10))
+        except ValueError:
+            return Response(
+                {"detail": "limit must be a number."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+        key = f"user:search:{limit}:{hashlib.md5(query.encode()).hexdigest()}"
+        results = cache.get(key)
+        if results is None:
+            users = User.objects.filter(is_active=True, is_superuser=False)
+            results = {}
+            for field in ("username", "email", "mobile_number"):
+                matches = users.filter(
+                    **{f"{field}__gte": query, f"{field}__lt": query + "\uffff"}
+                ).values("id", "username", "first_name", "last_name")
+                for user in matches.order_by(field)[:limit]:
+                    results.setdefault(user["id"], user)
+            results = list(results.values())[:limit]
+            cache.set(key, results, settings.USER_DIRECTORY_CACHE_TIMEOUT)
+
+        return Response(results, status=status.HTTP_200_OK)
+
+    @action(detail=False)
+    def resolve(self, request):
+        """
+        Map a comma separated list of usernames to user ids in one call.
+        Unknown usernames are listed under `missing`.
+        """
+        usernames = list(
+            dict.fromkeys(
+                username.strip()
+                for username in request.query_params.get("usernames", "").split(",")
+                if username.strip()
+            )
+        )
+        if len(usernames) > RESOLVE_MAX_USERNAMES:
+            return Response(
+                {"detail": f"At most {RESOLVE_MAX_USERNAMES} usernames per call."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        keys = {f"user:id:{username}": username for username in usernames}
+        resolved = {keys[key]: user_id for key, user_id in cache.get_many(keys).items()}
+        unresolved = [username for username in usernames if username not in resolved]
+        if unresolved:
+            found = dict(
+                User.objects.filter(
+                    username__in=unresolved, is_active=True, is_superuser=False
+                ).values_list("username", "id")
+            )
+            cache.set_many(
+                {f"user:id:{username}": user_id for username, user_id in found.items()},
+                settings.USER_DIRECTORY_CACHE_TIMEOUT,
+            )
+            resolved.update(found)
+
+        return Response(
+            {
+                "users": {u: resolved[u] for u in usernames if u in resolved},
+                "missing": [u for u in usernames if u not in resolved],
+            },
+            status=status.HTTP_200_OK,
+        )
+
 
 class UserRegisterViewSet(viewsets.ViewSet):
     serializer_class = UserRegisterSerializer
@@ -50,6 +148,8 @@ class UserRegisterViewSet(viewsets.ViewSet):
 class UserLoginViewSet(viewsets.ViewSet):
     serializer_class = UserLoginSerializer
     permission_classes = (AllowAny,)
+    # password hashing is expensive, limit attempts per client IP
+    throttle_classes = (LoginThrottle,)
     http_method_names = ["post"]
 
     def create(self, request, *args, **kwargs):